@@ -0,0 +1,288 @@
+'''
+Runs the matte tools over many scene files without the GUI, e.g. from mayapy:
+
+    mayapy batch.py --jobs 4 --timeout 900 --action mattes --action audit \
+            --save --out summary.json shot_010.mb shot_020.mb
+
+Every scene is processed in its own worker process (this script started
+again with --worker) so that a crash or a hang only costs that scene, the
+workers are killed after --timeout seconds and retried --retries times.
+With "--backend fake" the scene files are json files of the parameters of
+benchmark.makeScene and the scenes are built in a scene_backend.FakeScene,
+so the batch can be exercised without maya.
+With --profile the timings of the actions and of the utilities they call,
+with the scene calls they make, are added to the results of the scenes.
+'''
+#--------------------------------------------
+# Name:         batch.py
+# Purpose:      Headless batch processing of scene files
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import json
+import time
+import tempfile
+import optparse
+import traceback
+import subprocess
+import utilities as matte_util
+import matte_optimizer as mo
+
+def makeMattes():
+    ''' assigns ids to the materials that miss one and creates the mattes of
+    the materials whose ids are not in a material matte yet
+    @return: the names of the new mattes
+    '''
+    index = matte_util.SceneIndex()
+    covered = set()
+    for mtlIDs in matte_util.matteToMtlID(
+                        matte_util.getAllMaterialMultiMattes()).values():
+        covered.update(mtlIDs)
+    mtls = [mtl for mtl, mtlID in sorted(index.materialToID.items())
+            if not mtlID or mtlID not in covered]
+    return [str(m) for m in matte_util.makeMtlMatte(mtls) or []]
+
+def audit():
+    found = mo.MatteAudit()
+    return {'dead': found.dead,
+            'duplicates': [name for name, original in found.duplicates],
+            'partial': [name for name, unused in found.partial],
+            'disabled': found.disabled}
+
+def clean():
+    return mo.MatteAudit().deleteRedundant()
+
+def repack():
+    return mo.MatteRepack().apply()
+
+def checkIDs():
+    report = matte_util.MaterialIDReport()
+    return {'conflicts': dict([(str(mtlID), groups) for mtlID, groups
+                               in report.conflicts.items()]),
+            'missing': report.missing}
+
+def fixIDs():
+    return matte_util.MaterialIDReport().fix()
+
+ACTIONS = {'mattes': makeMattes, 'audit': audit, 'clean': clean,
+           'repack': repack, 'checkids': checkIDs, 'fixids': fixIDs}
+
+def openScene(path, backend):
+    ''' opens the scene and makes it the backend of the utilities module '''
+    if backend == 'fake':
+        import benchmark
+        handle = open(path)
+        try:
+            params = json.load(handle)
+        finally:
+            handle.close()
+        matte_util.setBackend(benchmark.makeScene(**params))
+        return
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    import maya.cmds as cmds
+    try:
+        cmds.loadPlugin('vrayformaya', quiet=True)
+    except RuntimeError:
+        pass
+    cmds.file(path, open=True, force=True)
+    matte_util.setBackend(None)
+
+def saveScene(backend):
+    if backend == 'fake':
+        return
+    import maya.cmds as cmds
+    cmds.file(save=True, force=True)
+
+def processScene(path, actions, backend='maya', save=False):
+    '''
+    runs the actions on one scene, in the current process
+    @return: [[action, result]] of the actions in order
+    '''
+    openScene(path, backend)
+    results = []
+    for action in actions:
+        func = matte_util.profiled(ACTIONS[action], 'batch.' + action)
+        results.append([action, func()])
+    if save:
+        saveScene(backend)
+    return results
+
+def runWorker(path, actions, backend, save, resultFile, profile=False):
+    ''' the body of a worker process, the result is written as json '''
+    start = time.time()
+    result = {'scene': path, 'status': 'ok'}
+    if profile:
+        matte_util.enableProfiling()
+    try:
+        result['actions'] = processScene(path, actions, backend, save)
+    except Exception:
+        result['status'] = 'failed'
+        result['error'] = traceback.format_exc()
+    if profile:
+        result['profile'] = matte_util.disableProfiling().report()
+    result['seconds'] = time.time() - start
+    out = open(resultFile, 'w')
+    try:
+        json.dump(result, out)
+    finally:
+        out.close()
+    if result['status'] == 'ok':
+        return 0
+    return 1
+
+class Worker(object):
+    ''' a worker process running one attempt on one scene '''
+    def __init__(self, scene, attempt, command):
+        self.scene = scene
+        self.attempt = attempt
+        handle, self.resultFile = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.logFile = tempfile.TemporaryFile()
+        self.start = time.time()
+        self.process = subprocess.Popen(command + ['--result',
+                                                   self.resultFile, scene],
+                                        stdout=self.logFile,
+                                        stderr=subprocess.STDOUT)
+
+    def poll(self, timeout):
+        ''' @return: the result dictionary if the worker is done or timed out
+        else None '''
+        seconds = time.time() - self.start
+        if self.process.poll() is None:
+            if seconds < timeout:
+                return None
+            self.process.kill()
+            self.process.wait()
+            result = {'scene': self.scene, 'status': 'timeout',
+                      'error': 'killed after %ds' % timeout}
+        else:
+            handle = open(self.resultFile)
+            try:
+                result = json.load(handle)
+            except ValueError:
+                self.logFile.seek(0)
+                result = {'scene': self.scene, 'status': 'failed',
+                          'error': 'exit code %s\n%s' % (
+                                        self.process.returncode,
+                                        self.logFile.read()[-2000:].decode(
+                                                    'utf-8', 'replace'))}
+            handle.close()
+        self.logFile.close()
+        os.remove(self.resultFile)
+        result['seconds'] = seconds
+        result['attempt'] = self.attempt
+        return result
+
+def runBatch(scenes, actions, jobs=4, timeout=600, retries=1,
+             backend='maya', save=False, executable=None, log=None,
+             profile=False):
+    '''
+    processes the scenes in a pool of worker processes
+    @param scenes: list of scene files
+    @param actions: list of the names of ACTIONS, run in the given order
+    @param jobs: maximum number of workers running at the same time
+    @param timeout: seconds after which a worker is killed
+    @param retries: number of times a failed or killed scene is tried again
+    @param executable: the python of the workers, mayapy for maya scenes,
+    sys.executable by default
+    @param profile: if True the results of the scenes have the "profile"
+    report of utilities.Profiler
+    @return: the summary dictionary
+    '''
+    command = [executable or sys.executable, os.path.abspath(__file__),
+               '--worker', '--backend', backend]
+    for action in actions:
+        command += ['--action', action]
+    if save:
+        command.append('--save')
+    if profile:
+        command.append('--profile')
+
+    start = time.time()
+    pending = [(scene, 1) for scene in scenes]
+    running = []
+    results = {}
+    while pending or running:
+        while pending and len(running) < jobs:
+            scene, attempt = pending.pop(0)
+            running.append(Worker(scene, attempt, command))
+        time.sleep(0.05)
+        for worker in running[:]:
+            result = worker.poll(timeout)
+            if result is None:
+                continue
+            running.remove(worker)
+            if result['status'] != 'ok' and worker.attempt <= retries:
+                pending.append((worker.scene, worker.attempt + 1))
+                continue
+            results[worker.scene] = result
+            if log is not None:
+                log.write('%-8s %6.1fs %s\n' % (result['status'],
+                                                result['seconds'],
+                                                worker.scene))
+    summary = {'version': 1, 'actions': actions,
+               'seconds': time.time() - start,
+               'scenes': [results[scene] for scene in scenes]}
+    for status in ('ok', 'failed', 'timeout'):
+        summary[status] = len([r for r in summary['scenes']
+                               if r['status'] == status])
+    return summary
+
+def main(args=None):
+    parser = optparse.OptionParser(usage='%prog [options] scene [scene ...]')
+    parser.add_option('-a', '--action', action='append',
+                      choices=sorted(ACTIONS),
+                      help='one of %s, can be repeated' % ', '.join(
+                                                            sorted(ACTIONS)))
+    parser.add_option('-j', '--jobs', type='int', default=4)
+    parser.add_option('-t', '--timeout', type='float', default=600,
+                      help='seconds allowed for every scene')
+    parser.add_option('-r', '--retries', type='int', default=1)
+    parser.add_option('-s', '--save', action='store_true', default=False,
+                      help='save the scenes after the actions')
+    parser.add_option('-b', '--backend', default='maya',
+                      choices=['maya', 'fake'])
+    parser.add_option('-e', '--executable',
+                      help='python of the workers (mayapy)')
+    parser.add_option('-p', '--profile', action='store_true', default=False,
+                      help='add the timings and the scene calls of the '
+                           'actions to the summary')
+    parser.add_option('-l', '--list',
+                      help='file with one scene path per line')
+    parser.add_option('-o', '--out', help='file to write the json summary')
+    parser.add_option('--worker', action='store_true', default=False,
+                      help=optparse.SUPPRESS_HELP)
+    parser.add_option('--result', help=optparse.SUPPRESS_HELP)
+    options, scenes = parser.parse_args(args)
+
+    actions = options.action or ['mattes']
+    if options.worker:
+        return runWorker(scenes[0], actions, options.backend, options.save,
+                         options.result, options.profile)
+
+    if options.list:
+        scenes += [line.strip() for line in open(options.list)
+                   if line.strip()]
+    if not scenes:
+        parser.error('no scene files given')
+    summary = runBatch(scenes, actions, options.jobs, options.timeout,
+                       options.retries, options.backend, options.save,
+                       options.executable, sys.stdout, options.profile)
+    if options.out:
+        out = open(options.out, 'w')
+        try:
+            json.dump(summary, out, indent=1, sort_keys=True)
+        finally:
+            out.close()
+    if summary['ok'] != len(scenes):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+'''
+Benchmarks of the scene queries and the matte creation of the plugin.
+Synthetic scenes are generated in a scene_backend.FakeScene so the benchmarks
+run headless without maya, every entry point is timed and the scene calls it
+makes are counted. The results are written as json and can be compared with
+the results of another commit:
+
+    python benchmark.py --out new.json --compare old.json --threshold 0.25
+'''
+#--------------------------------------------
+# Name:         benchmark.py
+# Purpose:      Scaling benchmarks on synthetic scenes
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import sys
+import json
+import random
+import timeit
+import optparse
+import scene_backend as sb
+import utilities as matte_util
+
+PRESETS = {
+    'small': [dict(meshes=100, materials=20, instances=1, faceSets=0,
+                   mattes=5)],
+    'medium': [dict(meshes=1000, materials=200, instances=1, faceSets=0,
+                    mattes=50),
+               dict(meshes=1000, materials=200, instances=4, faceSets=0,
+                    mattes=50),
+               dict(meshes=1000, materials=200, instances=1, faceSets=3,
+                    mattes=50)],
+    'large': [dict(meshes=10000, materials=2000, instances=1, faceSets=0,
+                   mattes=300),
+              dict(meshes=5000, materials=1000, instances=5, faceSets=2,
+                   mattes=300),
+              dict(meshes=50000, materials=5000, instances=1, faceSets=0,
+                   mattes=500)],
+}
+
+def makeScene(meshes=100, materials=20, instances=1, faceSets=0, mattes=0,
+              idRatio=0.5, seed=0):
+    '''
+    builds a synthetic FakeScene
+    @param meshes: number of mesh shapes
+    @param materials: number of materials, each with its own shadingEngine
+    @param instances: number of dag instances of every shape
+    @param faceSets: number of per face assignments on every instance, 0 means
+    the materials are assigned to the whole object
+    @param mattes: number of material multimattes already in the scene
+    @param idRatio: fraction of the materials that already have an id
+    @return: the FakeScene
+    '''
+    rand = random.Random(seed)
+    scene = sb.FakeScene()
+    ses = []
+    for num in range(materials):
+        mtlID = None
+        if rand.random() < idRatio:
+            mtlID = num + 1
+        mtl, se = scene.addMaterial('asset%d:mtl%d_shd' % (num % 10, num),
+                                    mtlID=mtlID)
+        ses.append(se)
+    for num in range(meshes):
+        for path in scene.addMesh('mesh%dShape' % num, instances):
+            if faceSets:
+                for faceSet in range(faceSets):
+                    scene.assign(path, rand.choice(ses), faceSet)
+            else:
+                scene.assign(path, rand.choice(ses))
+    for num in range(mattes):
+        matte = scene.createRenderElement('MultiMatteElement')
+        scene.setAttr(matte + '.vray_usematid_multimatte', True)
+        for attr in ('red', 'green', 'blue'):
+            scene.setAttr(matte + '.vray_%sid_multimatte' % attr,
+                          rand.randint(0, materials))
+    scene.undoStack = []
+    return scene
+
+def _refresh():
+    ''' what GUI.refresh asks of the scene: the id of every material and the
+    ids of every material matte '''
+    for mtl in matte_util.getAllMaterials():
+        matte_util.getMaterialID(mtl)
+    matte_util.matteToMtlID(matte_util.getAllMaterialMultiMattes())
+
+def _entryPoints(scene):
+    ''' @return: [(name, callable)] of the benchmarked entry points '''
+    meshes = list(scene.paths)
+    mtls = scene.ls(type='VRayMtl')
+    ids = list(range(1, len(mtls) + 1))
+    return [
+        ('materials', lambda: matte_util.materials(meshes)),
+        ('getAllMaterials', matte_util.getAllMaterials),
+        ('getLowestUniqueID', matte_util.getLowestUniqueID),
+        ('mtlToMatte', lambda: matte_util.mtlToMatte(ids)),
+        ('makeMtlMatte', lambda: matte_util.makeMtlMatte(mtls[:30])),
+        ('refresh', _refresh),
+    ]
+
+def runCase(params, repeat=3):
+    ''' times every entry point on a scene made from params
+    @return: list of result dictionaries
+    '''
+    results = []
+    names = [name for name, func in _entryPoints(sb.FakeScene())]
+    for name in names:
+        best = None
+        for rep in range(repeat):
+            scene = makeScene(**params)
+            counter = sb.CountingBackend(scene)
+            func = dict(_entryPoints(scene))[name]
+            matte_util.setBackend(counter)
+            try:
+                start = timeit.default_timer()
+                func()
+                seconds = timeit.default_timer() - start
+            finally:
+                matte_util.setBackend(None)
+            if best is None or seconds < best['seconds']:
+                best = {'case': caseName(params), 'params': params,
+                        'entry': name, 'seconds': seconds,
+                        'calls': dict(counter.counts),
+                        'totalCalls': counter.total()}
+        results.append(best)
+    return results
+
+def caseName(params):
+    return ','.join(['%s=%s' % (key, params[key])
+                     for key in sorted(params)])
+
+def run(cases, repeat=3, log=None):
+    results = []
+    for params in cases:
+        for result in runCase(params, repeat):
+            if log is not None:
+                log.write('%-60s %-18s %9.4fs %8d calls\n' % (
+                        result['case'], result['entry'], result['seconds'],
+                        result['totalCalls']))
+            results.append(result)
+    return {'version': 1, 'python': sys.version.split()[0],
+            'results': results}
+
+def compare(baseline, current, threshold=0.25, minSeconds=0.005):
+    '''
+    @return: list of (case, entry, what, old, new) for every entry point that
+    got slower than baseline by more than threshold, or makes more scene calls
+    than it did; timings below minSeconds are considered noise
+    '''
+    old = dict(((r['case'], r['entry']), r) for r in baseline['results'])
+    regressions = []
+    for new in current['results']:
+        base = old.get((new['case'], new['entry']))
+        if base is None:
+            continue
+        if (new['seconds'] > minSeconds and
+                new['seconds'] > base['seconds'] * (1 + threshold)):
+            regressions.append((new['case'], new['entry'], 'seconds',
+                                base['seconds'], new['seconds']))
+        if new['totalCalls'] > base['totalCalls'] * (1 + threshold):
+            regressions.append((new['case'], new['entry'], 'totalCalls',
+                                base['totalCalls'], new['totalCalls']))
+    return regressions
+
+def main(args=None):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-p', '--preset', default='small',
+                      choices=sorted(PRESETS),
+                      help='scene sizes to run: %s' % ', '.join(
+                                                        sorted(PRESETS)))
+    parser.add_option('-r', '--repeat', type='int', default=3)
+    parser.add_option('-o', '--out', help='file to write the json results')
+    parser.add_option('-c', '--compare', help='json results to compare with')
+    parser.add_option('-t', '--threshold', type='float', default=0.25,
+                      help='allowed relative slow down before failing')
+    options, args = parser.parse_args(args)
+
+    current = run(PRESETS[options.preset], options.repeat, sys.stdout)
+    if options.out:
+        out = open(options.out, 'w')
+        try:
+            json.dump(current, out, indent=1, sort_keys=True)
+        finally:
+            out.close()
+    if options.compare:
+        baseline = json.load(open(options.compare))
+        regressions = compare(baseline, current, options.threshold)
+        for case, entry, what, old, new in regressions:
+            sys.stdout.write('REGRESSION %s %s %s: %s -> %s\n' % (case,
+                                                    entry, what, old, new))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
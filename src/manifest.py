@@ -0,0 +1,147 @@
+'''
+Export and import of the matte setup of a scene as a small json manifest, so
+that the material ids and the multimattes of one shot can be re-applied on
+the other shots of a sequence in one go:
+
+    {"version": 1,
+     "materials": {"char:skin_mtl": 3, ...},
+     "mattes": {"skin_eyes_matte": [3, 4, 0, true, "skin_eyes_matte"], ...}}
+
+The mattes are stored as [red, green, blue, usematid, vray_name]. The
+namespaces of the materials can be remapped on import so that the manifest
+exported from one reference of an asset serves all its references.
+'''
+#--------------------------------------------
+# Name:         manifest.py
+# Purpose:      Export and import of the material ids and the multimattes
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import json
+import utilities as matte_util
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+VERSION = 1
+
+def exportManifest(index=None):
+    '''
+    @param index: SceneIndex to answer from, a new one is built if not given
+    @return: the manifest dictionary of the scene
+    '''
+    if index is None:
+        index = matte_util.SceneIndex()
+    materials = {}
+    for mtl, mtlID in index.materialToID.items():
+        if mtlID is not None:
+            materials[str(mtl)] = mtlID
+    mattes = {}
+    for matte in matte_util._multiMatteNames():
+        red, green, blue, use, name = matte_util._matteValues(matte)
+        mattes[matte] = [red, green, blue, bool(use), name]
+    return {'version': VERSION, 'materials': materials, 'mattes': mattes}
+
+def writeManifest(path, manifest=None):
+    if manifest is None:
+        manifest = exportManifest()
+    out = open(path, 'w')
+    try:
+        json.dump(manifest, out, indent=1, sort_keys=True)
+    finally:
+        out.close()
+
+def readManifest(path):
+    ''' @return: the manifest in the file, raises ValueError if the file is
+    not a manifest or is of a newer version '''
+    handle = open(path)
+    try:
+        manifest = json.load(handle)
+    finally:
+        handle.close()
+    if not isinstance(manifest, dict) or 'version' not in manifest:
+        raise ValueError('%s is not a matte manifest' % path)
+    if manifest['version'] > VERSION:
+        raise ValueError('%s is a version %s manifest, %s is supported' % (
+                                        path, manifest['version'], VERSION))
+    return manifest
+
+def remapName(name, namespaces):
+    '''
+    @param namespaces: {old namespace: new namespace or [new namespaces]},
+    the longest matching old namespace is used, "" is the root namespace
+    @return: the list of the names in the new namespaces
+    '''
+    parts = name.split(':')
+    for end in range(len(parts) - 1, -1, -1):
+        old = ':'.join(parts[:end])
+        if old not in namespaces:
+            continue
+        new = namespaces[old]
+        if isinstance(new, basestring):
+            new = [new]
+        rest = ':'.join(parts[end:])
+        return [ns and ns + ':' + rest or rest for ns in new]
+    return [name]
+
+def _setMatte(scene, matte, values):
+    ''' sets the attributes of the matte that differ from values
+    @return: True if the matte was changed '''
+    red, green, blue, use, name = values
+    current = matte_util._matteValues(matte)
+    if list(current) == [red, green, blue, use, name]:
+        return False
+    if list(current[:3]) != [red, green, blue]:
+        matte_util.setMatteMaterialID(matte, [red, green, blue])
+    if bool(current[3]) != use:
+        scene.setAttr(matte + '.vray_usematid_multimatte', use)
+    if current[4] != name:
+        scene.setAttr(matte + '.vray_name_multimatte', name)
+    matte_util.invalidate([matte])
+    return True
+
+@matte_util.singleUndoChunk
+def importManifest(manifest, namespaces=None):
+    '''
+    applies the manifest to the scene in a single undo chunk, the nodes that
+    already match it are not touched
+    @param manifest: dictionary from exportManifest or readManifest
+    @param namespaces: optional namespace remapping, see "remapName"
+    @return: {'materials': [set], 'mattes': [created or changed],
+    'missing': [materials not in the scene]}
+    '''
+    scene = matte_util.getBackend()
+    mtlIDs = {}
+    missing = []
+    for mtl, mtlID in sorted(manifest.get('materials', {}).items()):
+        names = [mtl]
+        if namespaces:
+            names = remapName(mtl, namespaces)
+        for name in names:
+            if matte_util.mayaMaterial(name) is None:
+                missing.append(name)
+            elif matte_util._materialIDFromName(name) != mtlID:
+                mtlIDs[name] = mtlID
+    written = matte_util.setMaterialIDs(mtlIDs)
+
+    existing = set(matte_util._multiMatteNames())
+    changed = []
+    new = []
+    for matte, values in sorted(manifest.get('mattes', {}).items()):
+        if matte not in existing:
+            new.append((matte, values))
+        elif _setMatte(scene, matte, values):
+            changed.append(matte)
+    created = matte_util.createMultiMattes([values[:3]
+                                            for matte, values in new],
+                                           [matte for matte, values in new])
+    for matte, (oldName, values) in zip(created, new):
+        _setMatte(scene, str(matte), values)
+        changed.append(str(matte))
+    return {'materials': sorted(written), 'mattes': changed,
+            'missing': missing}
@@ -22,14 +22,23 @@ import maya.OpenMaya as om
 import random, string
 import model_item as mi
 import utilities as matte_util
+import scene_watcher as sw
+import reference_cache as rc
+import refresh_queue as rq
 reload(mi)
 reload(matte_util)
+reload(sw)
+reload(rc)
 Qt = QtCore.Qt
 import os
 import qutil
 
 
-
+def action(func):
+    """makes func the slot of a user action, the action is recorded when the
+    profiling of the utilities is enabled e.g. by setting MATTEWORKS_PROFILE
+    to the path of the report"""
+    return QtCore.pyqtSlot()(matte_util.profiled(func, 'GUI.' + func.__name__))
 
 class Material(object):
     """
@@ -37,10 +46,11 @@ class Material(object):
     Basically a layer which does (almost) all the communication with the maya
     scene using the matte_util's module.
     """
-    def __init__(self, fpnMtl, container):
+    def __init__(self, fpnMtl, container, model):
         self.fpnMtl = fpnMtl
         self.container = container
-        self.mtlItem = []
+        self.model = model
+        self.mtlID = None
         #self.refresh()
 
     def refresh(self):
@@ -52,40 +62,72 @@ class Material(object):
         else:
             self.hide()
 
-    def changeID(self, mtlID, chunkOpen = False , looping = True):
+    def changeID(self, mtlID):
         if self.exists():
-            if looping:
-                matte_util.setMaterialID([self.fpnMtl], mtlID,
-                                                        chunkOpen = chunkOpen)
-                self.mtlID = matte_util.getMaterialID(self.fpnMtl)
-                for x in self.mtlItem:
-                    x.textChanged(mtlID, False, False)
+            written = matte_util.setMaterialIDs({self.fpnMtl: mtlID})
+            self.mtlID = written.get(self.fpnMtl, self.mtlID)
+            self.updateMaterialItems()
         else:
             self.hide()
 
     def updateMaterialItems(self):
-        tmp = self.mtlItem[:]
-        for mtlItem in tmp:
-            try:
-                text = mtlItem.text()
-                mtlItem.setText(text)
-            except:
-                self.mtlItem.pop(self.mtlItem.index(mtlItem))
-        map(lambda x: x.textChanged(self.mtlID, looping = False), self.mtlItem)
+        self.model.setMaterialID(self.fpnMtl, self.mtlID)
 
     def exists(self):
         return True
         return matte_util.materialExists(self.fpnMtl)
     def hide(self):
-        #hide the corresponding materialName and materialID items
+        #remove the corresponding material rows
         #and pop off self of the dict materials
-        map(lambda x:x.hide(), self.mtlItem)
-        self.container.pop(self.fpnMtl)
+        self.model.removeMaterial(self.fpnMtl)
+        self.container.pop(self.fpnMtl, None)
 
-    def addToMtlItemList(self, mtlItem):
-        """Add item to self.mtlItem
-        """
-        self.mtlItem.append(mtlItem)
+class ScanJob(QtCore.QObject):
+    """
+    Runs a generator cooperatively from the Qt event loop. The generator is
+    advanced for timeSlice seconds, then the job gives the control back to the
+    event loop so that maya stays interactive and continues on the next turn.
+    The generator must yield (label, done, total) tuples.
+    """
+    progress = QtCore.pyqtSignal(str, int, int)
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, steps, parent = None, timeSlice = 0.02):
+        super(ScanJob, self).__init__(parent)
+        self.steps = steps
+        self.timeSlice = timeSlice
+        self.running = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.step)
+
+    def start(self):
+        self.running = True
+        self.timer.start(0)
+
+    def cancel(self):
+        self.running = False
+        self.timer.stop()
+        self.steps.close()
+
+    @QtCore.pyqtSlot()
+    @matte_util.profiled('ScanJob.step')
+    def step(self):
+        if not self.running:
+            return
+        end = time.time() + self.timeSlice
+        try:
+            while time.time() < end:
+                label, done, total = next(self.steps)
+        except StopIteration:
+            self.running = False
+            self.finished.emit()
+            return
+        except:
+            self.running = False
+            raise
+        self.progress.emit(label, done, total)
+        self.timer.start(0)
 
 Form, Base = uic.loadUiType(os.path.join(qutil.dirname(__file__, 2), 'ui', 'ui.ui'))
 class GUI(Form, Base):
@@ -99,11 +141,24 @@ class GUI(Form, Base):
         #self.pluginDir = arg[0]
         pc.loadPlugin("vrayformaya.mll", qt = True)
 
+        # the actions and the scene calls they make are recorded to
+        # MATTEWORKS_PROFILE (json) and MATTEWORKS_PROFILE.trace (chrome
+        # trace) when the window is closed
+        self.profilePath = os.environ.get('MATTEWORKS_PROFILE')
+        if self.profilePath:
+            matte_util.enableProfiling()
+
+        self.materials = {}
+        # the materials of the referenced files are read from their cached
+        # tables by the scans
+        matte_util.setReferenceCache(rc.ReferenceCache())
+        self.scanJob = None
+        self.scanWidget.hide()
+        self.cancelScanButton.clicked.connect(self.cancelScan)
         self.createMaterialModel(True)
         self.updateMatteModel(True)
-        self.turnMeshItemVisible()
         self.makeMatteButton.clicked.connect(self.makeMatte)
-        self.refreshButton.clicked.connect(self.refresh)
+        self.refreshButton.clicked.connect(self.rescan)
         self.matteView.doubleClicked.connect(self.sceneMatteSelect)
         self.materialView.doubleClicked.connect(self.sceneMaterialSelect)
         map(self.clearSelectionButton.clicked.connect,
@@ -111,76 +166,268 @@ class GUI(Form, Base):
         map(self.addSelectionButton.clicked.connect, [self.addSelection])
         map(self.removeSelectionButton.clicked.connect,
                                                 [self.removeSelection])
-        map(self.undoButton.clicked.connect,
-                                    [matte_util.undo, self.refresh])
-        map(self.deleteMatteButton.clicked.connect,
-                        [self.deleteSelectedMatte, self.updateMatteModel])
-        self.expandAllButton.clicked.connect(self.materialView.expandAll)
+        self.undoButton.clicked.connect(self.undo)
+        self.deleteMatteButton.clicked.connect(self.deleteSelectedMatte)
+        self.expandAllButton.clicked.connect(self.expandAll)
         self.collapseAllButton.clicked.connect(
                                               self.materialView.collapseAll)
+        self.componentModeBox.toggled.connect(
+                                        self.materialModel.setComponentMode)
+
+        # the material model exposes only the rows matching the search, the
+        # rows of the (short) matte table that do not match are hidden
+        self.hiddenMattes = set()
+        self.filterTimer = QtCore.QTimer(self)
+        self.filterTimer.setSingleShot(True)
+        self.filterTimer.timeout.connect(self.applyFilter)
+        self.searchEdit.textChanged.connect(self.applyFilter)
+        for model in (self.materialModel, self.matteModel):
+            for signal in (model.rowsInserted, model.dataChanged,
+                           model.rowsRemoved):
+                signal.connect(self.filterLater)
+
+        # keep the models in sync with the scene through maya callbacks, the
+        # actions only mark the models dirty (see "refreshLater") and all the
+        # changes are applied together once per turn of the event loop
+        self.refreshQueue = rq.RefreshQueue()
+        self.sceneTimer = QtCore.QTimer(self)
+        self.sceneTimer.setSingleShot(True)
+        self.sceneTimer.timeout.connect(self.applySceneChanges)
+        self.watcher = sw.SceneWatcher(self.sceneChanged)
+        self.watcher.start(watchExisting = False)
+
+        # the materials and mattes are filled in by the scan, the existing
+        # nodes are watched as the scan finds them
+        self.rescan()
+
+    def closeEvent(self, event):
+        self.stopScan()
+        self.watcher.stop()
+        if self.profilePath:
+            profiler = matte_util.disableProfiling()
+            if profiler is not None:
+                profiler.write(self.profilePath)
+                profiler.write(self.profilePath + '.trace', chrome = True)
+        super(GUI, self).closeEvent(event)
+
+    @action
+    def rescan(self):
+        """starts a full scan of the scene in the background of the event
+        loop, a scan already running is cancelled"""
+        self.stopScan()
+        self.materialModel.clearCaches()
+        self.scanProgressBar.setRange(0, 0)
+        self.scanWidget.show()
+        self.scanJob = ScanJob(self.scanSteps(), self)
+        self.scanJob.progress.connect(self.scanProgress)
+        self.scanJob.finished.connect(self.stopScan)
+        self.scanJob.start()
+
+    def cancelScan(self):
+        """stops the running scan, the rows found so far stay in the models
+        and the nodes the scan did not reach are watched at once"""
+        if self.stopScan():
+            self.watcher.watchExisting()
+
+    def stopScan(self):
+        """stops the running scan
+        @return: True if a scan was running"""
+        running = False
+        if self.scanJob is not None:
+            running = self.scanJob.running
+            if running:
+                self.scanJob.cancel()
+            self.scanJob = None
+        self.scanWidget.hide()
+        return running
+
+    def scanProgress(self, label, done, total):
+        self.scanProgressBar.setFormat('%s %%v/%%m' % label)
+        self.scanProgressBar.setRange(0, total)
+        self.scanProgressBar.setValue(done)
+
+    def scanSteps(self):
+        """the scan of the materials and the mattes of the scene, the rows
+        are streamed into the models chunk by chunk and the nodes that are
+        not in the scene any more are removed at the end"""
+        seen = set()
+        for done, total, mtls in matte_util.scanMaterials():
+            for mtl in mtls:
+                name = mtl.name()
+                seen.add(name)
+                self.watcher.watchNode(mtl.__apimobject__())
+                self.material(name).refresh()
+            yield 'Scanning materials', done, total
+        for name, material in list(self.materials.items()):
+            if name not in seen:
+                material.hide()
+
+        model = self.matteModel
+        seen = set()
+        for done, total, rows in matte_util.scanMaterialMultiMattes():
+            for name, ids in rows:
+                seen.add(name)
+                if name in model.rows:
+                    model.updateMatte(name, ids)
+                else:
+                    model.insertMatte(name, ids)
+            yield 'Scanning mattes', done, total
+        for name in list(model.rows):
+            if name not in seen:
+                model.removeMatte(name)
+        for node in matte_util.getAllMultiMattes():
+            self.watcher.watchNode(node.__apimobject__())
+
+    def sceneChanged(self):
+        """called by the watcher from inside maya callbacks, the changes are
+        applied later from the event loop so that many notifications result
+        in a single update"""
+        if not self.sceneTimer.isActive():
+            self.sceneTimer.start(0)
+
+    def refreshLater(self, materials = True, mattes = True):
+        """marks the models to be synced with the scene, the models marked
+        by any number of calls are synced once on the next turn of the event
+        loop together with the changes found by the watcher"""
+        self.refreshQueue.mark(materials, mattes)
+        self.sceneChanged()
+
+    @action
+    def applySceneChanges(self):
+        """updates the rows of the materials and mattes marked dirty by the
+        watcher, or all of them for the models marked by "refreshLater" """
+        dirtyMaterials, dirtyMattes, fullRefresh = self.watcher.takeChanges()
+        allMaterials, dirtyMaterials, allMattes, dirtyMattes = (
+                self.refreshQueue.take(dirtyMaterials, dirtyMattes,
+                                       self.materials))
+        if fullRefresh:
+            # a new scene: the meshes, materials and ids shown are all gone
+            self.watcher.stop()
+            self.watcher.start(watchExisting = False)
+            self.materials.clear()
+            self.materialModel.clear()
+            self.rescan()
+            return
+        if allMaterials:
+            for material in list(self.materials.values()):
+                material.refresh()
+        for name in dirtyMaterials:
+            material = self.materials.get(name)
+            if not matte_util.materialExists(name):
+                if material is not None:
+                    material.hide()
+            elif material is None:
+                self.material(name)
+            else:
+                material.refresh()
+        if allMattes:
+            self.updateMatteModel()
+        else:
+            self.updateMattes(dirtyMattes)
+
+    def updateMattes(self, names):
+        """adds, removes or updates the rows of the given mattes only"""
+        model = self.matteModel
+        for name in names:
+            ids = None
+            if pc.objExists(name):
+                try:
+                    ids = matte_util.matteToMtlID([name])[name]
+                except ValueError:
+                    pass
+            if ids is None:
+                model.removeMatte(name)
+            elif name in model.rows:
+                model.updateMatte(name, ids)
+            else:
+                model.insertMatte(name, ids)
+
+    def changeMaterialIDs(self, mtlIDs):
+        """writes the ids of many materials through one bulk edit and
+        updates the view once
+        @param mtlIDs: {material fpn: id}"""
+        written = matte_util.setMaterialIDs(mtlIDs)
+        for mtl, mtlID in written.items():
+            self.material(mtl).mtlID = mtlID
+        self.materialModel.setMaterialIDs(written)
+
+    def filterLater(self, *args):
+        if self.searchEdit.text() and not self.filterTimer.isActive():
+            self.filterTimer.start(0)
+
+    @action
+    def applyFilter(self, *args):
+        text = str(self.searchEdit.text())
+        self.materialModel.setFilter(text)
+        self.filterMattes(text)
+
+    def filterMattes(self, text):
+        """hides the rows of the matte view that do not match text and shows
+        the ones that do, the rows whose state does not change are not
+        touched"""
+        model = self.matteModel
+        matching = model.searchIndex.search(text)
+        hidden = set()
+        if matching is not None:
+            hidden = set(model.searchIndex.texts).difference(matching)
+        for names, hide in ((self.hiddenMattes - hidden, False),
+                            (hidden - self.hiddenMattes, True)):
+            for name in names:
+                row = model.rowOfKey(name)
+                if row is not None:
+                    self.matteView.setRowHidden(row, hide)
+        self.hiddenMattes = hidden
 
     def sceneMaterialSelect(self, index):
-        item = self.materialModel.itemFromIndex(index)
-        if hasattr(item, "fpn"):
-            pc.select(item.fpn())
+        """selects the mesh or the material, or in the component mode the
+        faces of the mesh covered by the material"""
+        model = self.materialModel
+        faces = []
+        if model.componentMode:
+            faces = model.faceComponents(index)
+        pc.select(faces or model.fpn(index))
 
     def sceneMatteSelect(self, index):
+        pc.select(self.matteModel.matteName(index))
 
-        item = self.matteModel.itemFromIndex(index)
-        if hasattr(item, "name"):
-            pc.select(item.name())
+    @action
+    def expandAll(self):
+        self.materialView.expandAll()
 
+    @action
     def clearSelection(self):
         self.materialView.selectAll()
         self.removeSelection()
 
+    @action
     def addSelection(self):
-        """get the mesh name, search for it through the """
-        meshItems = {}
-        meshToMtlID = {}
-        for mesh in self.selection():
-            if not self.meshItems.get(mesh):
-                meshToMtlID = dict(meshToMtlID,
-                                    **matte_util.materials([mesh]))
-        self.populateMaterials()
-        for mesh in meshToMtlID:
-            meshItems[mesh] = mi.MeshItem(None, {mesh: meshToMtlID[mesh]},
-                                                        self.materials)
-        map(self.materialModel.appendRow, meshItems.values())
-        self.meshItems = dict(self.meshItems, **meshItems)
-        self.meshToMtlID = dict(self.meshToMtlID, **meshToMtlID)
+        """adds the selected meshes and their materials to the material
+        model"""
+        self.materialModel.addMeshes(self.selection())
 
+    @action
     def removeSelection(self):
-        self.refresh()
-        selection = self.materialView.selectionModel()
-        map(lambda y: map(lambda z : y(z),
-                        [self.materialModel.itemFromIndex(x).mesh.keys()[0]
-                        for x in self.materialView.selectedIndexes()
-                        if isinstance(self.materialModel.itemFromIndex(x),
-                                            mi.MeshItem)]),
-                        [self.meshItems.pop, self.meshToMtlID.pop])
-        checker = lambda : map(lambda y : y.row(),
-                            [x for x in self.materialView.selectedIndexes()
-                            if isinstance(
-                                self.materialModel.itemFromIndex(x),
-                                mi.MeshItem)
-                            ]
-                            )
-
-        while checker():
-            self.materialModel.removeRow(checker()[0])
-        self.refresh()
+        model = self.materialModel
+        model.removeMeshRows([model.meshRow(x)
+                              for x in self.materialView.selectedIndexes()
+                              if model.isMesh(x)])
+        self.refreshLater(mattes = False)
 
+    @action
     def deleteSelectedMatte(self):
-        matte_util.deleteMattes([x.text()
-                            for x in map(self.matteModel.itemFromIndex,
-                                self.matteView.selectedIndexes())
-                                if not x.text().isdigit()])
+        matte_util.deleteMattes(list(set([self.matteModel.matteName(x)
+                            for x in self.matteView.selectedIndexes()])))
+        self.refreshLater(materials = False)
 
     def redraw(self):
         self.updateMaterialModel()
         self.updateMatteModel()
 
+    @action
+    def undo(self):
+        matte_util.undo()
+        self.refreshLater()
+
     def refresh(self):
         """
         Now you have to do the following:
@@ -194,89 +441,57 @@ class GUI(Form, Base):
             mesh still attached to it.
         5. Check matte changes.
         6. To be found :P
+        #3 and #5 are done by "applySceneChanges" on the next turn of
+        the event loop, the refreshes asked in the same turn are done once
         """
-        selectionModel = self.materialView.selectionModel()
-        items = selectionModel.selection()
-        self.materialView.clearSelection()
-        #1:
-        #3:
-        map(lambda x: x.refresh(), self.materials.values())
-        #5:
-        self.updateMatteModel()
-        #4:
-        #to be implemented
-        #for blah in selectionModel.selectedIndexes()
-        selectionModel.select(items, selectionModel.SelectionFlag(2))
-
+        self.refreshLater()
+
+    def selectedMaterials(self):
+        """the unique materials of the selected rows in selection order"""
+        mtls = []
+        for index in self.materialView.selectedIndexes():
+            mtl = self.materialModel.materialFpn(index)
+            if mtl is not None and mtl not in mtls:
+                mtls.append(mtl)
+        return mtls
+
+    @action
     def makeMatte(self):
-        self.refresh()
-        listOfMtl = [x.mtlName
-                        for x in map(self.materialModel.itemFromIndex,
-                                    self.materialView.selectedIndexes())
-                                    if hasattr(x, "mtlName")]
-        matte_util.makeMtlMatte(listOfMtl)
-        self.refresh()
-        self.updateMatteModel()
+        matte_util.makeMtlMatte(self.selectedMaterials())
+        self.refreshLater()
+
+    def matteRows(self):
+        """@return: [(matteName, [red, green, blue])] of the material
+        mattes in the scene"""
+        mattes = matte_util.getAllMaterialMultiMattes()
+        ids = matte_util.matteToMtlID(mattes)
+        return [(str(x), ids[x]) for x in mattes]
 
     def updateMatteModel(self, first = False):
-        if not first: del self.matteModel
-
-        self.matteModel  = mi.MatteModel(self)
-        self.matteList = matte_util.getAllMaterialMultiMattes()
-        self.mattes = [mi.MatteItem(x) for x in self.matteList]
-        self.matteModel.appendColumn([x for x in self.mattes])
-        self.matteModel.appendColumn([x.red for x in self.mattes])
-        self.matteModel.appendColumn([x.green for x in self.mattes])
-        self.matteModel.appendColumn([x.blue for x in self.mattes])
-        self.matteView.setModel(self.matteModel)
-        self.matteView.setColumnWidth(0, 150)
-        self.matteModel.setHorizontalHeaderLabels(["MultiMatte Name",
-                                                "Red", "Green", "Blue"])
+        if first:
+            self.matteModel  = mi.MatteModel(self)
+            self.matteView.setModel(self.matteModel)
+            self.matteView.setColumnWidth(0, 150)
+            # the rows are streamed in by the scan
+        else:
+            self.matteModel.reconcile(self.matteRows())
 
     def createMaterialModel(self, first = False):
-        if first: self.materialModel = mi.MtlModel(self)
-        self.meshToMtlID={} #{mesh:{mtlID:[name],None:[name]}}
-        for mesh in self.selection():
-            #this redundant loop is being reused in addSelection.
-            #DRY it out, and rethink it
-            try:
-                self.meshToMtlID = dict(self.meshToMtlID,
-                                        **matte_util.materials([mesh]))
-            except:
-                continue
-
-        self.populateMaterials()
-        self.populateMeshItems()
-        self.materialModel.appendColumn(self.meshItems.values())
-        self.materialModel.setHorizontalHeaderLabels(["Material Name",
-                                                        "Material ID"])
-        self.materialView.setModel(self.materialModel)
-
-    def turnMeshItemVisible(self):
-        for mesh in self.selection():
-            #self.meshItems[mesh].show()
-            pass
-
-    def turnMeshItemInvisible(self):
-        for mesh in self.selection():
-            self.meshItems[mesh].hide()
+        if first:
+            self.materialModel = mi.MtlModel(self)
+            self.materialView.setModel(self.materialModel)
+        # the Material entries are made by the scan and the edits
+        self.materialModel.addMeshes(self.selection())
 
     def selection(self):
         return pc.ls(sl = True, type = "mesh", dag = True, ni = True)
 
-    def populateMaterials(self):
-        try:
-            self.materials
-        except:
-            self.materials = {}
-        for material in matte_util.getAllMaterials():
-            if not self.materials.get(material.name()):
-                self.materials[material.name()] = Material(material.name(),
-                                                            self.materials)
-
-    def populateMeshItems(self):
-        self.meshItems = {}
-        for mesh in self.meshToMtlID:
-            self.meshItems[mesh] = mi.MeshItem(None,
-                                            {mesh: self.meshToMtlID[mesh]},
-                                                self.materials)
\ No newline at end of file
+    def material(self, name):
+        """@return: the Material of the given name, it is made the first time
+        it is asked for so that the materials need not be collected from the
+        whole scene before they are edited"""
+        material = self.materials.get(name)
+        if material is None:
+            material = Material(name, self.materials, self.materialModel)
+            self.materials[name] = material
+        return material
@@ -0,0 +1,273 @@
+'''
+Optimizations of the material multimattes of the scene.
+"MatteRepack" collects the ids used by all the material multimattes and packs
+them in the fewest RGB triplets, every MultiMatteElement costs render time and
+channels in the exr so the mattes half empty or repeating the same ids are
+wasted. The plan can be reported as a dry run before it is applied.
+"MatteAudit" finds the multimattes that are dead, duplicated or partially
+dead and cleans them up.
+'''
+#--------------------------------------------
+# Name:         matte_optimizer.py
+# Purpose:      Repacking of the material multimattes
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import utilities as matte_util
+
+def namespaceGroups(index=None):
+    '''
+    @param index: SceneIndex to answer from, a new one is built if not given
+    @return: a groupBy callable for MatteRepack that keeps together the ids of
+    the materials of the same namespace (i.e. the same referenced asset)
+    '''
+    if index is None:
+        index = matte_util.SceneIndex()
+    def _group(mtlID):
+        mtls = index.idToMaterials.get(mtlID)
+        if not mtls:
+            return ''
+        return str(mtls[0]).rpartition(':')[0]
+    return _group
+
+class MatteRepack(object):
+    '''
+    Plans the repacking of the material multimattes, nothing is changed in
+    the scene until "apply" is called.
+
+    mattes:     [(matteName, [red, green, blue])] of the scene, in name order
+    triplets:   [[mtlID, ...]] the planned content of the mattes
+    changes:    [(matteName, oldIDs, newIDs, newName)] mattes that are reused
+    created:    [(newIDs, newName)] mattes that have to be created
+    deleted:    [matteName] mattes that are not needed any more
+
+    @param groupBy: optional callable(mtlID) returning a group key, the ids of
+    a group are packed in their own mattes and never share a matte with the
+    ids of another group
+    @param index: SceneIndex used for the names of the mattes
+    @param dropUnused: if True the ids that no material uses are left out
+    '''
+    def __init__(self, groupBy=None, index=None, dropUnused=False):
+        if index is None:
+            index = matte_util.SceneIndex()
+        self.index = index
+        self.groupBy = groupBy
+        self.dropUnused = dropUnused
+        self.mattes = []
+        self.triplets = []
+        self.changes = []
+        self.created = []
+        self.deleted = []
+        self.plan()
+
+    def usedIDs(self):
+        ''' @return: sorted list of the non zero ids used by the mattes '''
+        ids = set()
+        for matte, mtlIDs in self.mattes:
+            ids.update([mtlID for mtlID in mtlIDs if mtlID])
+        if self.dropUnused:
+            ids = [mtlID for mtlID in ids if mtlID in self.index.idToMaterials]
+        return sorted(ids)
+
+    def plan(self):
+        ''' (re)reads the mattes of the scene and computes the plan '''
+        names = sorted([str(m)
+                        for m in matte_util.getAllMaterialMultiMattes()])
+        ids = matte_util.matteToMtlID(names)
+        self.mattes = [(name, list(ids[name])) for name in names]
+
+        groups = {}
+        order = []
+        for mtlID in self.usedIDs():
+            key = None
+            if self.groupBy is not None:
+                key = self.groupBy(mtlID)
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(mtlID)
+        self.triplets = []
+        for key in order:
+            mtlIDs = groups[key]
+            for start in range(0, len(mtlIDs), 3):
+                self.triplets.append(mtlIDs[start:start + 3])
+
+        # the mattes which already hold a planned triplet are kept as they
+        # are, the others are reused in order for the remaining triplets
+        def _key(mtlIDs):
+            return tuple(sorted([mtlID for mtlID in mtlIDs if mtlID]))
+        wanted = {}
+        for num, triplet in enumerate(self.triplets):
+            wanted.setdefault(_key(triplet), []).append(num)
+        kept = set()
+        free = []
+        for matte, mtlIDs in self.mattes:
+            nums = wanted.get(_key(mtlIDs))
+            if nums:
+                kept.add(nums.pop(0))
+            else:
+                free.append((matte, mtlIDs))
+
+        self.changes = []
+        self.created = []
+        for num, triplet in enumerate(self.triplets):
+            if num in kept:
+                continue
+            newIDs = self._padded(triplet)
+            if free:
+                matte, oldIDs = free.pop(0)
+                self.changes.append((matte, oldIDs, newIDs,
+                                     self._matteName(triplet)))
+            else:
+                self.created.append((newIDs, self._matteName(triplet)))
+        self.deleted = [matte for matte, mtlIDs in free]
+
+    def _padded(self, triplet):
+        return (list(triplet) + [0, 0, 0])[:3]
+
+    def _matteName(self, triplet):
+        names = []
+        for mtlID in triplet:
+            mtls = self.index.idToMaterials.get(mtlID)
+            if mtls:
+                names.append(matte_util._matteShortName(mtls[0]))
+            else:
+                names.append('id%d' % mtlID)
+        return '_'.join(names) + '_matte'
+
+    def isNeeded(self):
+        return bool(self.changes or self.created or self.deleted)
+
+    def report(self):
+        ''' @return: the plan as a human readable string (the dry run) '''
+        lines = ['%d material mattes use %d ids, %d mattes are needed' % (
+                    len(self.mattes), len(self.usedIDs()), len(self.triplets))]
+        for matte, oldIDs, newIDs, newName in self.changes:
+            lines.append('change %s %s -> %s %s' % (matte, oldIDs, newName,
+                                                    newIDs))
+        for newIDs, newName in self.created:
+            lines.append('create %s %s' % (newName, newIDs))
+        for matte in self.deleted:
+            lines.append('delete %s' % matte)
+        if not self.isNeeded():
+            lines.append('nothing to do')
+        return '\n'.join(lines)
+
+    @matte_util.singleUndoChunk
+    def apply(self):
+        '''
+        changes the scene according to the plan, in a single undo chunk
+        @return: the names of the mattes that were changed or created
+        '''
+        result = []
+        if self.deleted:
+            matte_util.deleteMattes(self.deleted)
+        for matte, oldIDs, newIDs, newName in self.changes:
+            matte_util.setMatteMaterialID(matte, newIDs)
+            result.append(str(matte_util.renameMatte(matte, newName)))
+        if self.created:
+            mattes = matte_util.createMultiMattes(
+                            [newIDs for newIDs, newName in self.created],
+                            [newName for newIDs, newName in self.created])
+            result.extend([str(m) for m in mattes])
+        return result
+
+class MatteAudit(object):
+    '''
+    Looks for the multimattes that cost render time for nothing, in a single
+    pass over the mattes with the ids looked up in a SceneIndex.
+
+    dead:       [matteName] material mattes none of whose ids is used by a
+                material (or whose ids are all 0)
+    duplicates: [(matteName, originalName)] material mattes with the same ids
+                as another one
+    partial:    [(matteName, [unused ids])] material mattes with some ids not
+                used by any material
+    disabled:   [matteName] multimattes with vray_usematid_multimatte off,
+                they are ignored by the tool but may still be object mattes
+
+    @param index: SceneIndex to answer from, a new one is built if not given
+    '''
+    def __init__(self, index=None):
+        if index is None:
+            index = matte_util.SceneIndex()
+        self.index = index
+        self.dead = []
+        self.duplicates = []
+        self.partial = []
+        self.disabled = []
+        self.audit()
+
+    def audit(self):
+        ''' (re)reads the multimattes of the scene '''
+        self.dead = []
+        self.duplicates = []
+        self.partial = []
+        self.disabled = []
+        names = sorted([str(m) for m in matte_util.getAllMultiMattes()])
+        ids = matte_util.matteToMtlID(names)
+        seen = {}
+        for name in names:
+            mtlIDs = ids[name]
+            if mtlIDs is None:
+                self.disabled.append(name)
+                continue
+            mtlIDs = sorted(set([mtlID for mtlID in mtlIDs if mtlID]))
+            unused = [mtlID for mtlID in mtlIDs
+                      if mtlID not in self.index.idToMaterials]
+            key = tuple(mtlIDs)
+            if len(unused) == len(mtlIDs):
+                self.dead.append(name)
+            elif key in seen:
+                self.duplicates.append((name, seen[key]))
+            else:
+                seen[key] = name
+                if unused:
+                    self.partial.append((name, unused))
+
+    def isClean(self):
+        return not (self.dead or self.duplicates or self.partial)
+
+    def report(self):
+        ''' @return: the findings as a human readable string '''
+        lines = []
+        for name in self.dead:
+            lines.append('dead %s' % name)
+        for name, original in self.duplicates:
+            lines.append('duplicate %s of %s' % (name, original))
+        for name, unused in self.partial:
+            lines.append('partial %s unused ids %s' % (name, unused))
+        for name in self.disabled:
+            lines.append('disabled %s' % name)
+        if not lines:
+            lines.append('no redundant mattes')
+        return '\n'.join(lines)
+
+    @matte_util.singleUndoChunk
+    def deleteRedundant(self, includeDisabled=False):
+        '''
+        deletes the dead and the duplicate mattes in one undo chunk
+        @param includeDisabled: delete the disabled mattes as well
+        @return: the names of the deleted mattes
+        '''
+        mattes = self.dead + [name for name, original in self.duplicates]
+        if includeDisabled:
+            mattes += self.disabled
+        if mattes:
+            matte_util.deleteMattes(mattes)
+        self.audit()
+        return mattes
+
+    def consolidate(self, groupBy=None):
+        '''
+        drops the unused ids and repacks the material mattes in the fewest
+        mattes, the dead and duplicate mattes are deleted on the way
+        @return: the MatteRepack that was applied
+        '''
+        repack = MatteRepack(groupBy, self.index, dropUnused=True)
+        repack.apply()
+        self.audit()
+        return repack
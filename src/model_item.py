@@ -1,11 +1,12 @@
 """
-This module contains all the helper classes (models and items) required to
-construct the model and the view items, implement its interaction with the
-Material layer.
+This module contains all the helper classes (models) required to construct
+the views, and implements their interaction with the Material layer.
+The models keep their rows in compact parallel lists and only turn them into
+Qt data when the view asks for it in "data".
 """
 #--------------------------------------------
 # Name:         matteWorker.py
-# Purpose:      Customized QStandardItemModel and QStandardItem classes
+# Purpose:      Customized QAbstractItemModel classes
 # Author:       Hussain Parsaiyan
 # License:      GPL v3
 # Created       15/09/2012
@@ -15,141 +16,551 @@ Material layer.
 import qtify_maya_window as qtfy
 from PyQt4 import QtGui, QtCore
 import utilities as matte_util
+import search_index as si
 reload(matte_util)
 
 Qt = QtCore.Qt
 
-class MatteModel(QtGui.QStandardItemModel):
+def processMtlID(mtlID):
+    """the text shown for a material id, ids that are not set show empty"""
+    return str(mtlID) if isinstance(mtlID, int) and mtlID else ""
+
+def shortName(fpn):
+    return fpn.split(":")[-1]
+
+def contiguousRuns(rows):
+    """@return: [(first, last)] of the runs of consecutive numbers in the
+    sorted list rows"""
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] == row - 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return [tuple(run) for run in runs]
+
+class MatteModel(QtCore.QAbstractTableModel):
+    """
+    One row per material multimatte, the names and the [red, green, blue] ids
+    are held in two parallel lists
+    """
+    headers = ["MultiMatte Name", "Red", "Green", "Blue"]
+
     def __init__(self, parent = None):
         super(MatteModel, self).__init__(parent)
-        self.itemChanged.connect(self.changeMatteID)
+        self.names = []
+        self.ids = []
+        self.rows = {} #{matteName: row}
+        self.searchIndex = si.SearchIndex() #keyed by matteName
+
+    def rowCount(self, parent = QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def columnCount(self, parent = QtCore.QModelIndex()):
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
 
-    def changeMatteID(self, matte):
-        matte_util.setMatteMaterialID(matte.parent.text(),
-                                    [matte.parent.red.text(),
-                                     matte.parent.green.text(),
-                                     matte.parent.blue.text()])
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column():
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        if index.column():
+            return str(self.ids[index.row()][index.column()-1])
+        return self.names[index.row()]
+
+    def setData(self, index, value, role = Qt.EditRole):
+        if not index.isValid() or not index.column() or role != Qt.EditRole:
+            return False
+        value = str(value)
+        if not value.isdigit():
+            return False
+        row = index.row()
+        self.ids[row][index.column()-1] = int(value)
+        self._indexMatte(self.names[row], self.ids[row])
+        self.changeMatteID(row)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def changeMatteID(self, row):
+        matte_util.setMatteMaterialID(self.names[row], self.ids[row])
+
+    def matteName(self, index):
+        return self.names[index.row()]
+
+    def reconcile(self, mattes):
+        """brings the rows in line with mattes by removing, updating and
+        appending only the rows that differ, so the selection and the scroll
+        position of the view are kept
+        @param mattes: [(matteName, [red, green, blue])]
+        """
+        wanted = dict(mattes)
+        gone = [row for row, name in enumerate(self.names)
+                if name not in wanted]
+        for first, last in reversed(contiguousRuns(gone)):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            for name in self.names[first:last+1]:
+                self.searchIndex.remove(name)
+            del self.names[first:last+1]
+            del self.ids[first:last+1]
+            self.endRemoveRows()
+        if gone:
+            self._reindex()
+        new = []
+        added = set()
+        for name, ids in mattes:
+            if name in self.rows:
+                self.updateMatte(name, ids)
+            elif name not in added:
+                added.add(name)
+                new.append((name, ids))
+        if new:
+            first = len(self.names)
+            self.beginInsertRows(QtCore.QModelIndex(), first,
+                                 first + len(new) - 1)
+            self.names.extend([name for name, ids in new])
+            self.ids.extend([list(ids) for name, ids in new])
+            self._reindex(first)
+            for name, ids in new:
+                self._indexMatte(name, ids)
+            self.endInsertRows()
 
-class MtlModel(QtGui.QStandardItemModel):
+    def insertMatte(self, name, ids, row = None):
+        if row is None:
+            row = len(self.names)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.names.insert(row, name)
+        self.ids.insert(row, list(ids))
+        self._reindex(row)
+        self._indexMatte(name, ids)
+        self.endInsertRows()
+
+    def removeMatte(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.names[row]
+        del self.ids[row]
+        del self.rows[name]
+        self.searchIndex.remove(name)
+        self._reindex(row)
+        self.endRemoveRows()
+
+    def updateMatte(self, name, ids):
+        row = self.rows[name]
+        if self.ids[row] != list(ids):
+            self.ids[row] = list(ids)
+            self._indexMatte(name, ids)
+            self.dataChanged.emit(self.index(row, 1),
+                                  self.index(row, len(self.headers)-1))
+
+    def _indexMatte(self, name, ids):
+        self.searchIndex.set(name, si.searchTerms(name) +
+                             [str(mtlID) for mtlID in ids if mtlID])
+
+    def rowOfKey(self, name):
+        return self.rows.get(name)
+
+    def _reindex(self, start = 0):
+        if not start:
+            self.rows = {}
+        for row in range(start, len(self.names)):
+            self.rows[self.names[row]] = row
+
+class MtlModel(QtCore.QAbstractItemModel):
+    """
+    Two level model, a row for every mesh with a child row for every material
+    assigned to it. The meshes are kept in parallel lists, the children only as
+    the material names and the ids in one table shared by all the meshes.
+    The internal id of a child index is the stable key of its mesh row, the
+    top level indices have the internal id 0.
+    The materials of a mesh are resolved when its row is added so that the
+    search finds it by them, the assignments are resolved and cached per
+    shape and per connection signature by a utilities.AssignmentResolver so
+    that the instances of a shape are looked up once.
+    In the component mode the material rows show the number of faces of the
+    mesh they cover, the faces are kept as FaceRuns (see "meshFaces").
+    The mesh rows are searched by the names of the mesh and of its resolved
+    materials and by their ids, the searchIndex is keyed by the mesh keys.
+    While a filter is set only the matching mesh rows are exposed to the view,
+    "shown" maps the rows of the view to the rows of the lists (see
+    "setFilter"), the methods taking a row of the lists say so.
+    """
+    headers = ["Material Name", "Material ID"]
 
     def __init__(self, parent = None):
         super(MtlModel, self).__init__(parent)
-        self.itemChanged.connect(self.changeMtlID)
-
-    def changeMtlID(self, mtl):
-        selectIDItems = [x
-                        for x in map(self.itemFromIndex,
-                                self.parent().materialView.selectedIndexes())
-                                if hasattr(x, "mtlName")]+[mtl]\
-                                if hasattr(mtl, "mtlName")\
-                                else []
-        #selectIDItems = [x for x in set(selectIDItems)]
-        self.itemChanged.disconnect(self.changeMtlID)
-        mtlToEdit = [x.mtlName for x in selectIDItems]
-        #matte_util.setMaterialID(mtlToEdit, mtl.text())
-        #mtlToEdit.pop(mtlToEdit.index(mtl))
-        for x in selectIDItems:
-            x.textChanged(mtl.text(), True)\
-            if selectIDItems.index(x) < len(selectIDItems) -1\
-            else x.textChanged(mtl.text())
-        if not hasattr(mtl, "mtlName"): mtl.setText("")
-        self.itemChanged.connect(self.changeMtlID)
+        self.meshFpns = []
+        self.meshNodes = []
+        self.meshKeys = []
+        self.meshMtls = [] #[[material fpn, ...]]
+        self.meshShapes = [] #[(shape, instNo)] read when the row is added
+        self.resolver = matte_util.AssignmentResolver()
+        self.componentMode = False
+        self.faces = {} #{mesh key: {material fpn: FaceRuns}}
+        self.keyToRow = {}
+        self.meshKeyOf = {} #{mesh fpn: mesh key}
+        self.mtlIDs = {} #{material fpn: mtlID}
+        self.mtlMeshKeys = {} #{material fpn: set([mesh key, ...])}
+        self._nextKey = 1
+        self.searchIndex = si.SearchIndex()
+        self.shown = None #[list row] of the view rows or None if unfiltered
+        self.shownRow = {} #{list row: view row}
+
+    def parent(self, index = None):
+        if index is None:
+            return QtCore.QObject.parent(self)
+        if not index.isValid() or not index.internalId():
+            return QtCore.QModelIndex()
+        return self.meshIndex(self.keyToRow[index.internalId()])
+
+    def index(self, row, column, parent = QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column,
+                                self.meshKeys[self.meshRow(parent)])
+
+    def meshIndex(self, row, column = 0):
+        """@return: the index of the list row, invalid if it is filtered
+        out"""
+        if self.shown is not None:
+            row = self.shownRow.get(row)
+            if row is None:
+                return QtCore.QModelIndex()
+        return self.createIndex(row, column, 0)
+
+    def rowCount(self, parent = QtCore.QModelIndex()):
+        if not parent.isValid():
+            if self.shown is not None:
+                return len(self.shown)
+            return len(self.meshFpns)
+        if parent.internalId() or parent.column():
+            return 0
+        return len(self.meshMtls[self.meshRow(parent)])
+
+    def hasChildren(self, parent = QtCore.QModelIndex()):
+        if not parent.isValid():
+            return bool(self.rowCount())
+        if parent.internalId() or parent.column():
+            return False
+        return bool(self.meshMtls[self.meshRow(parent)])
+
+    def columnCount(self, parent = QtCore.QModelIndex()):
+        return len(self.headers)
 
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.internalId() and index.column() == 1:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ToolTipRole:
+            return self.fpn(index)
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        if not index.internalId():
+            if index.column():
+                return None
+            return shortName(self.meshFpns[self.meshRow(index)])
+        mtl = self.materialFpn(index)
+        if index.column():
+            return processMtlID(self.mtlIDs.get(mtl))
+        if self.componentMode and role == Qt.DisplayRole:
+            runs = self.meshFaces(self.keyToRow[index.internalId()]).get(mtl)
+            if runs is not None:
+                return "%s (%d faces)" % (shortName(mtl), runs.count())
+        return shortName(mtl)
+
+    def setData(self, index, value, role = Qt.EditRole):
+        if (role != Qt.EditRole or not index.isValid() or
+                not index.internalId() or index.column() != 1):
+            return False
+        self.changeMtlID(index, str(value))
+        return True
+
+    def changeMtlID(self, index, text):
+        """sets the id on the edited material and on all the selected ones
+        in one bulk edit"""
+        view = self.parent().materialView
+        mtls = [self.materialFpn(x) for x in view.selectedIndexes()
+                if x.column() == 1 and x.internalId()]
+        mtls.append(self.materialFpn(index))
+        # anything but a positive number clears the id
+        mtlID = text.isdigit() and int(text) or 0
+        self.parent().changeMaterialIDs(dict((mtl, mtlID) for mtl in mtls))
 
     def setMakeMatteButtonState(self):
         #not functional right now
-        self.parent().makeMatteButton.setEnabled(True
-                    if len(self.parent().materialView.selectedIndexes()) > 0
-                    else True)
+        self.parent().makeMatteButton.setEnabled(True)
+
+    # lookups
+
+    def isMesh(self, index):
+        return index.isValid() and not index.internalId()
+
+    def meshRow(self, index):
+        """@return: the list row of the mesh of the index"""
+        if index.internalId():
+            return self.keyToRow[index.internalId()]
+        if self.shown is not None:
+            return self.shown[index.row()]
+        return index.row()
+
+    def meshFpn(self, index):
+        return self.meshFpns[self.meshRow(index)]
+
+    def meshNode(self, index):
+        return self.meshNodes[self.meshRow(index)]
+
+    def materialFpn(self, index):
+        """@return: the material of a child index or None for mesh rows"""
+        if not index.isValid() or not index.internalId():
+            return None
+        return self.meshMtls[self.keyToRow[index.internalId()]][index.row()]
+
+    def meshFaces(self, row):
+        """@return: {material fpn: FaceRuns} of the mesh at the list row,
+        read when first asked for"""
+        key = self.meshKeys[row]
+        faces = self.faces.get(key)
+        if faces is None:
+            faces = self.faces[key] = self.resolver.faces(self.meshNodes[row])
+        return faces
+
+    def faceComponents(self, index):
+        """@return: the faces of the mesh covered by the material of the
+        child index as component names, [] for mesh rows"""
+        mtl = self.materialFpn(index)
+        if mtl is None:
+            return []
+        row = self.keyToRow[index.internalId()]
+        runs = self.meshFaces(row).get(mtl)
+        if runs is None:
+            return []
+        return runs.components(self.meshFpns[row])
+
+    def setComponentMode(self, on):
+        """shows the number of faces covered by the materials or not"""
+        self.componentMode = bool(on)
+        self.faces.clear()
+        self.layoutAboutToBeChanged.emit()
+        self.layoutChanged.emit()
 
-    def hide(self, index):
-        pass
+    def fpn(self, index):
+        """full path name of the mesh or material at index"""
+        return self.materialFpn(index) or self.meshFpn(index)
 
-class MatteItem(QtGui.QStandardItem):
+    # edits
 
-    def __init__(self,matte = None, parent = None):
+    def addMeshes(self, meshes):
+        """appends a row for every mesh not in the model yet with a child row
+        for every material of the mesh
+        @param meshes: list of meshes (pymel.core.mesh)
         """
-        @param text: The name of the item/mesh
-        @param parent: The parent Item of this QStandardItem
+        new = []
+        seen = set(self.meshKeyOf)
+        for mesh in meshes:
+            if str(mesh) not in seen:
+                seen.add(str(mesh))
+                new.append(mesh)
+        if not new:
+            return
+        scene = matte_util.getBackend()
+        shapes = [scene.shapeInstance(mesh) for mesh in new]
+        self.resolver.forget([shape for shape, instNo in shapes])
+        first = len(self.meshFpns)
+        if self.shown is not None:
+            # the new rows are indexed first, only the matching ones are
+            # exposed at the end of the view
+            self._appendMeshes(new, shapes)
+            rows = [row for row in range(first, len(self.meshFpns))
+                    if self.meshKeys[row] in self.searchIndex.result]
+            if rows:
+                self.beginInsertRows(QtCore.QModelIndex(), len(self.shown),
+                                     len(self.shown) + len(rows) - 1)
+                for row in rows:
+                    self.shownRow[row] = len(self.shown)
+                    self.shown.append(row)
+                self.endInsertRows()
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), first,
+                             first + len(new) - 1)
+        self._appendMeshes(new, shapes)
+        self.endInsertRows()
+
+    def _appendMeshes(self, new, shapes):
+        for mesh, shape in zip(new, shapes):
+            key = self._nextKey
+            self._nextKey += 1
+            self.keyToRow[key] = len(self.meshFpns)
+            self.meshKeyOf[str(mesh)] = key
+            self.meshFpns.append(str(mesh))
+            self.meshNodes.append(mesh)
+            self.meshKeys.append(key)
+            self.meshMtls.append(self._meshMaterials(mesh, key))
+            self.meshShapes.append(shape)
+            self._indexMesh(len(self.meshFpns) - 1)
+
+    def removeMeshRows(self, rows):
+        """removes the given list rows, the meshes may not exist any more"""
+        rows = sorted(set(rows), reverse = True)
+        self.resolver.forget([self.meshShapes[row][0] for row in rows])
+        self._removeMeshRows(rows)
+
+    def _removeMeshRows(self, rows):
+        for row in rows:
+            shownRow = row
+            if self.shown is not None:
+                shownRow = self.shownRow.get(row)
+            if shownRow is not None:
+                self.beginRemoveRows(QtCore.QModelIndex(), shownRow,
+                                     shownRow)
+            key = self.meshKeys[row]
+            self.faces.pop(key, None)
+            for mtl in self.meshMtls[row]:
+                keys = self.mtlMeshKeys.get(mtl)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.mtlMeshKeys[mtl]
+                        self.mtlIDs.pop(mtl, None)
+            del self.meshKeyOf[self.meshFpns[row]]
+            for column in (self.meshFpns, self.meshNodes, self.meshKeys,
+                           self.meshMtls, self.meshShapes):
+                del column[row]
+            del self.keyToRow[key]
+            self.searchIndex.remove(key)
+            self._reindex(row)
+            if self.shown is not None:
+                self.shown = [r - (r > row) for r in self.shown if r != row]
+                self.shownRow = dict([(r, num)
+                                      for num, r in enumerate(self.shown)])
+            if shownRow is not None:
+                self.endRemoveRows()
+
+    def _reindex(self, start = 0):
+        for row in range(start, len(self.meshKeys)):
+            self.keyToRow[self.meshKeys[row]] = row
+
+    def _meshMaterials(self, mesh, key):
+        """@return: the list of the materials of the mesh of the given key,
+        their ids are read if the model does not know them yet"""
+        mtls = list(self.resolver.materialNames(mesh))
+        for mtl in mtls:
+            # the ids known to the model are kept up to date by the edits
+            if mtl not in self.mtlIDs:
+                self.mtlIDs[mtl] = matte_util._materialIDFromName(mtl)
+            self.mtlMeshKeys.setdefault(mtl, set()).add(key)
+        return mtls
+
+    def _indexMesh(self, row):
+        terms = si.searchTerms(self.meshFpns[row])
+        for mtl in self.meshMtls[row]:
+            terms += si.searchTerms(mtl)
+            terms.append(processMtlID(self.mtlIDs.get(mtl)))
+        self.searchIndex.set(self.meshKeys[row], terms)
+
+    def setFilter(self, text):
+        """exposes only the mesh rows matching text (all of them if text is
+        empty), the persistent indices of the view (expanded and selected
+        rows) are moved to the new rows
+        @return: the number of the rows exposed"""
+        matching = self.searchIndex.search(text)
+        shown = None
+        if matching is not None:
+            shown = sorted([self.keyToRow[key] for key in matching])
+        if shown == self.shown:
+            return self.rowCount()
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        rows = [self.meshRow(index) for index in old]
+        self.shown = shown
+        self.shownRow = {}
+        if shown is not None:
+            self.shownRow = dict([(row, num) for num, row in enumerate(shown)])
+        new = []
+        for index, row in zip(old, rows):
+            parent = self.meshIndex(row)
+            if not parent.isValid() or not index.internalId():
+                new.append(self.meshIndex(row, index.column()))
+            else:
+                new.append(index)
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+        return self.rowCount()
+
+    def clear(self):
+        self._removeMeshRows(range(len(self.meshFpns) - 1, -1, -1))
+        self.mtlIDs.clear()
+        self.mtlMeshKeys.clear()
+        self.clearCaches()
+
+    def clearCaches(self):
+        """forgets the assignments resolved so far, they are read again from
+        the scene for the meshes added next"""
+        self.resolver.clear()
+        self.faces.clear()
+
+    def setMaterialID(self, mtl, mtlID):
+        """updates the id shown in every row of the material"""
+        self.setMaterialIDs({mtl: mtlID})
+
+    def setMaterialIDs(self, mtlIDs):
+        """updates the ids shown in the rows of many materials, a single
+        dataChanged is emitted for the id column of every affected mesh
+        @param mtlIDs: {material fpn: mtlID}
         """
-        super(MatteItem, self).__init__(matte.name() if hasattr(matte, "name")
-                                                    else matte)
-        self.parent = parent
-        self.setEditable(False)
-        if hasattr(matte, "name"):
-            self.red = MatteItem(str(matte.vray_redid_multimatte.get()), self)
-            self.green = MatteItem(str(matte.vray_greenid_multimatte.get()),
-                                                                        self)
-            self.blue = MatteItem(str(matte.vray_blueid_multimatte.get()), self)
-            [x.setEditable(True) for x in [self.red, self.green, self.blue]]
-            self.matteName = matte.name()
-            self.name = lambda : self.matteName
-
-
-class MeshItem(QtGui.QStandardItem):
-
-    def __init__(self, *arg ):
-        self.parent,self.mesh, self.materials = arg
-        #mesh = {meshnode : {1:[mtlName], None:[mtlName]}}
-        super(MeshItem,self).__init__(self.mesh.keys()[0].name().split(":")[-1])
-        self.fpnMesh = self.mesh.keys()[0].name()
-        self.mtlNameToID = {} #{materialName: ID}
-        for xMtlID in self.mesh.values():
-            for x in xMtlID:
-                for y in xMtlID[x]:
-                    self.mtlNameToID[y.name()] = x
-            self.setEditable(False)
-        #self.hide()
-        self.giveChild()
-
-    def hide(self):
-        model.hide(model.indexFromItem(self))
-
-    def giveChild(self):
-        #appends a child, *item*, to self and sets self to tristate
-        mtlItems = [MtlNameItem(self, mtlName) for mtlName in self.mtlNameToID]
-        self.appendColumn(mtlItems)
-        [x.setEditable(False) for x in mtlItems]
-        self.appendColumn([MtlIDItem(self, mtlName,
-                        self.mtlNameToID[mtlName.fpnMtl],
-                        self.materials[mtlName.fpnMtl])
-                        for mtlName in mtlItems])
-
-    def fpn(self):
-        return self.fpnMesh
-
-class MtlNameItem(QtGui.QStandardItem):
-    def __init__(self, parent = None, mtl = None):
-        super(MtlNameItem, self).__init__(mtl.split(":")[-1])
-        self.fpnMtl = mtl
-
-    def hide(self):
-        model.hide(model.indexFromItem(self))
-
-    def fpn(self):
-        return self.fpnMtl
-
-class MtlIDItem(QtGui.QStandardItem):
-
-    def __init__(self, parent = None, *arg):
-        mtl, mtlID, material = arg
-        self.mtlNameItem = mtl
-        self.mtlName = mtl.fpnMtl
-        super(MtlIDItem, self).__init__(self.processMtlID(mtlID))
-        self.material = material
-        self.material.addToMtlItemList(self)
-
-    def processMtlID(self, mtlID):
-        return str(mtlID) if isinstance(mtlID, int) and mtlID else ""
-
-    def textChanged(self, text, chunkOpen = False, looping = True):
-
-        if isinstance(text, int) or text == None:
-            text = self.processMtlID(text)
-        val = text.isdigit() and int(text)
-        self.setText(text if val else "")
-        if looping:
-            self.material.changeID(self.text(), chunkOpen, looping )
-
-    def hide(self):
-        model.hide(model.indexFromItem(self))
\ No newline at end of file
+        changed = {} #{mesh key: [child rows]}
+        for mtl, mtlID in mtlIDs.items():
+            if mtl not in self.mtlIDs or self.mtlIDs[mtl] == mtlID:
+                continue
+            self.mtlIDs[mtl] = mtlID
+            for key in self.mtlMeshKeys.get(mtl, ()):
+                child = self.meshMtls[self.keyToRow[key]].index(mtl)
+                changed.setdefault(key, []).append(child)
+        for key, children in changed.items():
+            self._indexMesh(self.keyToRow[key])
+            if not self.meshIndex(self.keyToRow[key]).isValid():
+                continue
+            self.dataChanged.emit(self.createIndex(min(children), 1, key),
+                                  self.createIndex(max(children), 1, key))
+
+    def removeMaterial(self, mtl):
+        """removes the rows of the material from under all the meshes"""
+        self.clearCaches()
+        for key in list(self.mtlMeshKeys.pop(mtl, ())):
+            row = self.keyToRow[key]
+            child = self.meshMtls[row].index(mtl)
+            parent = self.meshIndex(row)
+            if parent.isValid():
+                self.beginRemoveRows(parent, child, child)
+            del self.meshMtls[row][child]
+            self._indexMesh(row)
+            if parent.isValid():
+                self.endRemoveRows()
+        self.mtlIDs.pop(mtl, None)
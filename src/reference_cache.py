@@ -0,0 +1,201 @@
+'''
+A persistent cache of the material tables of the referenced files. A rig
+referenced forty times in a shot has the same shading networks in every one
+of its namespaces, the tables of its shadingEngines (material, id and the
+mesh instances in the set) are stored once per file on disk with the names
+relative to the namespace, and are reused for every namespace and every
+session while the file does not change (same mtime and size, or the same
+content hash).
+Only the nodes edited in the shot (the reference edits) are queried again.
+
+    cache = ReferenceCache()
+    matte_util.setReferenceCache(cache)
+'''
+#--------------------------------------------
+# Name:         reference_cache.py
+# Purpose:      On disk cache of the material tables of the references
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import json
+import hashlib
+import utilities as matte_util
+
+VERSION = 1
+
+def defaultDirectory():
+    return os.environ.get('MATTEWORKS_CACHE',
+                          os.path.join(os.path.expanduser('~'), '.matteWorks',
+                                       'cache'))
+
+def localName(name, namespace):
+    ''' @return: the name (or dag path) with the namespace removed from all of
+    its parts, None if a part is not in the namespace '''
+    prefix = namespace + ':'
+    parts = []
+    for part in name.split('|'):
+        if part:
+            if not part.startswith(prefix):
+                return None
+            part = part[len(prefix):]
+        parts.append(part)
+    return '|'.join(parts)
+
+def namespacedName(name, namespace):
+    ''' the inverse of localName '''
+    prefix = namespace + ':'
+    return '|'.join([part and prefix + part for part in name.split('|')])
+
+class ReferenceCache(object):
+    '''
+    The tables are json files in directory named after the hash of the path
+    of the referenced file:
+
+        {"version": 1, "path": ..., "key": ...,
+         "shadingEngines": {se: [material, mtlID, [[shape, instNo], ...]]}}
+
+    @param directory: where the tables are kept, see "defaultDirectory"
+    @param useHash: if True the files are recognized by the hash of their
+    content instead of their mtime and size, slower but survives copies
+    '''
+    def __init__(self, directory=None, useHash=False):
+        self.directory = directory or defaultDirectory()
+        self.useHash = useHash
+        self.tables = {}  # {path: table} loaded in this session
+        self.misses = []  # [(path, namespace, edited)] of the last "fill"
+
+    def fileKey(self, path):
+        ''' @return: the string identifying the current content of the file
+        or None if the file cannot be read '''
+        try:
+            if self.useHash:
+                digest = hashlib.sha1()
+                handle = open(path, 'rb')
+                try:
+                    block = handle.read(1 << 20)
+                    while block:
+                        digest.update(block)
+                        block = handle.read(1 << 20)
+                finally:
+                    handle.close()
+                return 'sha1:' + digest.hexdigest()
+            stat = os.stat(path)
+        except (IOError, OSError):
+            return None
+        return 'stat:%r:%d' % (stat.st_mtime, stat.st_size)
+
+    def tablePath(self, path):
+        name = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def load(self, path):
+        ''' @return: the table of the file if it is still valid else None '''
+        key = self.fileKey(path)
+        if key is None:
+            return None
+        table = self.tables.get(path)
+        if table is None:
+            try:
+                handle = open(self.tablePath(path))
+                try:
+                    table = json.load(handle)
+                finally:
+                    handle.close()
+            except (IOError, OSError, ValueError):
+                return None
+        if table.get('version') != VERSION or table.get('key') != key:
+            self.tables.pop(path, None)
+            return None
+        self.tables[path] = table
+        return table
+
+    def save(self, path, table):
+        table['version'] = VERSION
+        table['path'] = path
+        table['key'] = self.fileKey(path)
+        if table['key'] is None:
+            return
+        self.tables[path] = table
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        out = open(self.tablePath(path), 'w')
+        try:
+            json.dump(table, out)
+        finally:
+            out.close()
+
+    def fill(self, index):
+        '''
+        adds the shadingEngines of the cached references to the SceneIndex,
+        the ones whose nodes were edited in the scene are left out
+        @return: the set of the shadingEngines added
+        '''
+        filled = set()
+        for se, shader, mtlID, members in self.entries():
+            index.addShadingEngine(se, shader, members, mtlID)
+            filled.add(se)
+        return filled
+
+    def entries(self):
+        '''
+        the shadingEngines of the cached references in the namespaces of the
+        scene, the ones whose nodes were edited in the scene are left out and
+        the references without a valid table are kept in "misses"
+        @return: generator of (se, shader, mtlID, [(shape, instNo)]), mtlID is
+        utilities._missing if the material was edited
+        '''
+        scene = matte_util.getBackend()
+        self.misses = []
+        for path, namespace in scene.references():
+            edited = set(scene.referenceEdits(path))
+            table = self.load(path)
+            if table is None:
+                self.misses.append((path, namespace, edited))
+                continue
+            for se, (shader, mtlID, members) in (
+                                        table['shadingEngines'].items()):
+                se = namespacedName(se, namespace)
+                shader = namespacedName(shader, namespace)
+                members = [(namespacedName(shape, namespace), instNo)
+                           for shape, instNo in members]
+                if se in edited or [shape for shape, instNo in members
+                                    if shape in edited]:
+                    continue
+                if shader in edited:
+                    mtlID = matte_util._missing
+                yield se, shader, mtlID, members
+
+    def update(self, shadingEngines):
+        ''' stores the tables of the references missed by the last "fill" or
+        "entries", from the shadingEngines that were not edited
+        @param shadingEngines: {se: (shader, mtlID, [(shape, instNo)])} e.g.
+        SceneIndex.shadingEngines '''
+        done = set()
+        # the table of a file is taken from its least edited reference
+        self.misses.sort(key=lambda miss: len(miss[2]))
+        for path, namespace, edited in self.misses:
+            if path in done:
+                continue
+            done.add(path)
+            table = {}
+            for se, (shader, mtlID, members) in shadingEngines.items():
+                if se in edited or shader in edited:
+                    continue
+                localSE = localName(se, namespace)
+                localShader = localName(shader, namespace)
+                localMembers = []
+                for shape, instNo in members:
+                    localShape = localName(shape, namespace)
+                    if localShape is None or shape in edited:
+                        localMembers = None
+                        break
+                    localMembers.append([localShape, instNo])
+                if None in (localSE, localShader, localMembers):
+                    continue
+                table[localSE] = [localShader, mtlID, localMembers]
+            self.save(path, {'shadingEngines': table})
+        self.misses = []
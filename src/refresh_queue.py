@@ -0,0 +1,53 @@
+'''
+The bookkeeping of the refreshes of the models of the GUI. The actions mark
+the models they affect and the scene watcher marks the nodes that changed,
+everything marked until the next turn of the event loop is then applied in a
+single pass, so every model is synced at most once per turn however many
+marks it got.
+'''
+#--------------------------------------------
+# Name:         refresh_queue.py
+# Purpose:      Coalescing of the refreshes of the models
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+
+class RefreshQueue(object):
+    '''
+    materialModel:  True if the whole material model has to be synced
+    matteModel:     True if the whole matte model has to be synced
+    '''
+    def __init__(self):
+        self.materialModel = False
+        self.matteModel = False
+
+    def mark(self, materials=True, mattes=True):
+        ''' marks the models to be synced on the next "take" '''
+        self.materialModel = self.materialModel or materials
+        self.matteModel = self.matteModel or mattes
+
+    def take(self, dirtyMaterials, dirtyMattes, knownMaterials=()):
+        '''
+        merges the marks with the nodes the watcher found dirty and clears
+        the marks
+        @param dirtyMaterials: names of the materials marked by the watcher
+        @param dirtyMattes: names of the mattes marked by the watcher
+        @param knownMaterials: the materials of the model, all of them are
+        synced when the material model is marked
+        @return: (allMaterials, materials, allMattes, mattes) the flags tell
+        if the whole models have to be synced, the lists are the names left
+        to sync one by one (the ones not covered by the whole sync)
+        '''
+        allMaterials, allMattes = self.materialModel, self.matteModel
+        self.materialModel = self.matteModel = False
+        materials = sorted(dirtyMaterials)
+        if allMaterials:
+            materials = [name for name in materials
+                         if name not in knownMaterials]
+        mattes = []
+        if not allMattes:
+            mattes = sorted(dirtyMattes)
+        return allMaterials, materials, allMattes, mattes
@@ -0,0 +1,735 @@
+'''
+This module contains the scene backends used by the utilities module to talk
+to the scene. MayaBackend makes the actual calls to maya, FakeScene is a pure
+python in memory scene graph that mimics the few parts of maya the plugin
+relies on, so that the algorithms can be exercised and timed without maya.
+The backends work with plain node and plug names, the "node" method turns a
+name into the handle that is returned to the callers of the utilities (a PyNode
+in maya, the name itself in the fake scene).
+'''
+#--------------------------------------------
+# Name:         scene_backend.py
+# Purpose:      Maya and in memory implementations of the scene interface
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import re
+
+_copyNumber = re.compile(r'\{\d+\}$')
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+class SceneBackend(object):
+    '''
+    The interface of the scene used by the utilities module. The attribute
+    queries raise ValueError when the node or the attribute does not exist,
+    "error" raises RuntimeError.
+    '''
+    def ls(self, type=None, selection=False):
+        ''' @return: list of node names of the given type '''
+        raise NotImplementedError
+
+    def objExists(self, name):
+        raise NotImplementedError
+
+    def nodeType(self, name):
+        raise NotImplementedError
+
+    def getAttr(self, plug, multiIndices=False):
+        ''' @return: the value of plug or the list of its existing logical
+        indices if multiIndices is True '''
+        raise NotImplementedError
+
+    def setAttr(self, plug, value):
+        raise NotImplementedError
+
+    def hasAttr(self, node, attr):
+        raise NotImplementedError
+
+    def withAttr(self, nodes, attr):
+        ''' @return: set of the given nodes that exist and have attr, the
+        backends answer it in one query '''
+        return set([node for node in nodes
+                    if self.objExists(node) and self.hasAttr(node, attr)])
+
+    def addAttr(self, node, longName, attributeType='long', **kwargs):
+        raise NotImplementedError
+
+    def listConnections(self, plugs, source=True, destination=True,
+                        asPlugs=False, type=None, connections=False):
+        ''' @return: the flattened list of nodes (or plugs if asPlugs is True)
+        connected to the given plugs or nodes, if connections is True every
+        one of them is preceded by the local plug of the connection '''
+        raise NotImplementedError
+
+    def createRenderElement(self, classType, existing=None):
+        ''' creates a vray render element and returns its name
+        @param existing: set of the names of the render elements that existed
+        before, it may be used to identify the new node '''
+        raise NotImplementedError
+
+    def rename(self, node, newName):
+        ''' @return: the name the node actually got '''
+        raise NotImplementedError
+
+    def delete(self, nodes):
+        raise NotImplementedError
+
+    def selection(self):
+        raise NotImplementedError
+
+    def select(self, nodes):
+        raise NotImplementedError
+
+    def openUndoChunk(self):
+        raise NotImplementedError
+
+    def closeUndoChunk(self):
+        raise NotImplementedError
+
+    def undo(self):
+        raise NotImplementedError
+
+    def isMaterial(self, name):
+        ''' @return: True if name is a node that can be used as material '''
+        raise NotImplementedError
+
+    def isSurfaceShader(self, name):
+        ''' @return: True if name is a node classified as a surface shader,
+        unlike the textures and utilities that have an outColor too '''
+        raise NotImplementedError
+
+    def instanceNumber(self, mesh):
+        raise NotImplementedError
+
+    def fullPath(self, mesh):
+        raise NotImplementedError
+
+    def meshInstance(self, shape, instNo):
+        ''' @return: handle of the instNo'th instance of the shape '''
+        raise NotImplementedError
+
+    def shapeInstance(self, mesh):
+        ''' the inverse of meshInstance
+        @return: (shape, instNo) the shape is the same for all the instances
+        '''
+        raise NotImplementedError
+
+    def faceCount(self, mesh):
+        raise NotImplementedError
+
+    def node(self, name):
+        ''' @return: the handle for name that is given back to the callers '''
+        return name
+
+    def clearCaches(self):
+        ''' forgets what the backend remembers of the scene, e.g. the dag
+        paths of the instances '''
+        pass
+
+    def references(self):
+        ''' @return: [(file path, namespace)] of the loaded references '''
+        return []
+
+    def referenceEdits(self, path):
+        ''' @return: names of the nodes of the reference edited in the scene
+        '''
+        return []
+
+    def warning(self, msg):
+        raise NotImplementedError
+
+    def error(self, msg):
+        raise RuntimeError(msg)
+
+class MayaBackend(SceneBackend):
+    '''
+    The backend that queries and edits the current maya scene, the bulk reads
+    go through maya.cmds and PyNodes are only made in "node"
+    '''
+    def __init__(self):
+        import pymel.core as pc
+        import maya.cmds as mc
+        import maya.OpenMaya as om
+        self.pc = pc
+        self.mc = mc
+        self.om = om
+        self._instances = {} # {shape hash: (MObjectHandle, [full path])}
+        self._surfaceTypes = {} # {node type: bool}
+
+    def ls(self, type=None, selection=False):
+        kwargs = {}
+        if type is not None:
+            kwargs['type'] = type
+        if selection:
+            kwargs['sl'] = True
+        try:
+            return self.mc.ls(**kwargs) or []
+        except RuntimeError:
+            # the type of a plugin that is not loaded
+            return []
+
+    def objExists(self, name):
+        return self.mc.objExists(name)
+
+    def nodeType(self, name):
+        return self.mc.nodeType(name)
+
+    def getAttr(self, plug, multiIndices=False):
+        try:
+            if multiIndices:
+                return self.mc.getAttr(plug, mi=True) or []
+            return self.mc.getAttr(plug)
+        except RuntimeError:
+            raise ValueError('No object matches name: %s' % plug)
+
+    def setAttr(self, plug, value):
+        if isinstance(value, basestring):
+            self.mc.setAttr(plug, value, type='string')
+        else:
+            self.mc.setAttr(plug, value)
+
+    def hasAttr(self, node, attr):
+        return self.mc.attributeQuery(attr, node=node, exists=True)
+
+    def withAttr(self, nodes, attr):
+        if not nodes:
+            return set()
+        plugs = set(self.mc.ls(['%s.%s' % (node, attr) for node in nodes])
+                    or [])
+        return set([node for node in nodes if '%s.%s' % (node, attr) in plugs])
+
+    def addAttr(self, node, longName, attributeType='long', **kwargs):
+        self.mc.addAttr(node, ln=longName, at=attributeType, **kwargs)
+
+    def listConnections(self, plugs, source=True, destination=True,
+                        asPlugs=False, type=None, connections=False):
+        if not plugs:
+            return []
+        kwargs = dict(s=source, d=destination, plugs=asPlugs, c=connections)
+        if type is not None:
+            kwargs['type'] = type
+        try:
+            return self.mc.listConnections(plugs, **kwargs) or []
+        except (ValueError, RuntimeError):
+            return []
+
+    def createRenderElement(self, classType, existing=None):
+        if existing is None:
+            existing = set(self.ls(type='VRayRenderElement'))
+        res = self.pc.Mel.eval("vrayAddRenderElement %s" % classType)
+        try:
+            if (res and res not in existing and self.mc.getAttr(
+                            res + '.vrayClassType') == classType):
+                return res
+        except (ValueError, RuntimeError, TypeError):
+            pass
+        # vray did not give back the name, look for the new node
+        for node in self.ls(type='VRayRenderElement'):
+            if node not in existing:
+                return node
+
+    def rename(self, node, newName):
+        return self.mc.rename(node, newName)
+
+    def delete(self, nodes):
+        if nodes:
+            self.mc.delete(nodes)
+
+    def selection(self):
+        return self.ls(selection=True)
+
+    def select(self, nodes):
+        if nodes:
+            self.mc.select(nodes, replace=True)
+        else:
+            self.mc.select(clear=True)
+
+    def openUndoChunk(self):
+        self.mc.undoInfo(openChunk=True)
+
+    def closeUndoChunk(self):
+        self.mc.undoInfo(closeChunk=True)
+
+    def undo(self):
+        self.mc.undo()
+
+    def isMaterial(self, name):
+        return (self.mc.objExists(name) and
+                self.mc.attributeQuery('outColor', node=name, exists=True))
+
+    def isSurfaceShader(self, name):
+        if not self.mc.objExists(name):
+            return False
+        nodeType = self.mc.nodeType(name)
+        if nodeType not in self._surfaceTypes:
+            self._surfaceTypes[nodeType] = any(
+                    'shader/surface' in classification for classification in
+                    self.mc.getClassification(nodeType) or [])
+        return self._surfaceTypes[nodeType]
+
+    def instanceNumber(self, mesh):
+        return self._dagPath(mesh).instanceNumber()
+
+    def fullPath(self, mesh):
+        return self._dagPath(mesh).fullPathName()
+
+    def meshInstance(self, shape, instNo):
+        if instNo:
+            return self.pc.PyNode(self._instancePaths(shape)[instNo])
+        return self.pc.PyNode(shape)
+
+    def shapeInstance(self, mesh):
+        return (self._instancePaths(str(mesh))[0],
+                self._dagPath(mesh).instanceNumber())
+
+    def _dagPath(self, mesh):
+        sel = self.om.MSelectionList()
+        sel.add(str(mesh))
+        path = self.om.MDagPath()
+        sel.getDagPath(0, path)
+        return path
+
+    def _instancePaths(self, name):
+        ''' @return: the full paths of the instances of the shape in the
+        order of their instance numbers, listed once per shape '''
+        sel = self.om.MSelectionList()
+        sel.add(name)
+        obj = self.om.MObject()
+        sel.getDependNode(0, obj)
+        handle = self.om.MObjectHandle(obj)
+        cached = self._instances.get(handle.hashCode())
+        if cached is not None and cached[0].isValid() and cached[0] == handle:
+            return cached[1]
+        dagPaths = self.om.MDagPathArray()
+        self.om.MDagPath.getAllPathsTo(obj, dagPaths)
+        paths = [dagPaths[i].fullPathName() for i in range(dagPaths.length())]
+        self._instances[handle.hashCode()] = (handle, paths)
+        return paths
+
+    def clearCaches(self):
+        self._instances.clear()
+
+    def faceCount(self, mesh):
+        return self.mc.polyEvaluate(str(mesh), face=True)
+
+    def node(self, name):
+        return self.pc.PyNode(name)
+
+    def references(self):
+        refs = []
+        for path in self.mc.file(q=True, reference=True) or []:
+            if not self.mc.referenceQuery(path, isLoaded=True):
+                continue
+            namespace = self.mc.referenceQuery(path, namespace=True)
+            refs.append((_copyNumber.sub('', path), namespace.lstrip(':')))
+        return refs
+
+    def referenceEdits(self, path):
+        nodes = []
+        for ref in self.mc.file(q=True, reference=True) or []:
+            if _copyNumber.sub('', ref) == path:
+                nodes.extend(self.mc.referenceQuery(ref, editNodes=True)
+                             or [])
+        return nodes
+
+    def warning(self, msg):
+        self.pc.warning(msg)
+
+    def error(self, msg):
+        self.pc.error(msg)
+
+class FakeNode(object):
+    __slots__ = ('name', 'type', 'attrs', 'connections')
+
+    def __init__(self, name, type, attrs=None):
+        self.name = name
+        self.type = type
+        self.attrs = attrs or {}
+        self.connections = []  # [(localPlug, remotePlug, isSource)]
+
+_element = re.compile(r'\[(\d+)\]$')
+
+class FakeScene(SceneBackend):
+    '''
+    A pure python scene graph. Nodes have a type, a dictionary of attribute
+    values and connections between plug names, dag instances of a shape are
+    addressed by their paths. The edits are journaled so that undo chunks can
+    be undone like in maya. Helpers like addMesh, addMaterial and assign are
+    provided to build synthetic scenes.
+    '''
+    surfaceShaderTypes = set(['VRayMtl', 'lambert', 'blinn', 'phong',
+                              'surfaceShader', 'VRayBlendMtl',
+                              'VRayMtl2Sided', 'VRayMtlWrapper',
+                              'VRaySwitchMtl'])
+
+    def __init__(self):
+        self.nodes = {}
+        self.byType = {}
+        self.paths = {}  # {instance path: (shape, instNo)}
+        self.instances = {}  # {shape: [instance paths]}
+        self.selected = []
+        self.warnings = []
+        self.undoStack = []
+        self._chunk = None
+        self._chunkDepth = 0
+        self._replaying = False
+        self._counters = {}
+        self._memberCounts = {}
+        self.refs = []  # [(path, namespace)]
+        self.edits = {}  # {namespace: set([edited node names])}
+
+    # building the scene
+
+    def createNode(self, type, name=None, attrs=None):
+        name = self._uniqueName(name or type + '1')
+        self.nodes[name] = FakeNode(name, type, dict(attrs or {}))
+        self.byType.setdefault(type, []).append(name)
+        self._record(lambda: self._remove(name))
+        return name
+
+    def addMaterial(self, name, type='VRayMtl', mtlID=None):
+        ''' creates a material and a shadingEngine for it
+        @return: (material name, shadingEngine name)
+        '''
+        mtl = self.createNode(type, name, {'outColor': (0.5, 0.5, 0.5)})
+        if mtlID is not None:
+            self.nodes[mtl].attrs['vrayMaterialId'] = mtlID
+        se = self.createNode('shadingEngine', mtl + 'SG')
+        self.connectAttr(mtl + '.outColor', se + '.surfaceShader')
+        return mtl, se
+
+    def addMesh(self, name, instances=1, faces=6):
+        ''' creates a mesh shape with the given number of dag instances
+        @return: list of the instance paths, the first one is the shape name
+        '''
+        shape = self.createNode('mesh', name, {'faceCount': faces})
+        paths = [shape]
+        for instNo in range(1, instances):
+            paths.append('|%s_instance%d|%s' % (shape, instNo, shape))
+        for instNo, path in enumerate(paths):
+            self.paths[path] = (shape, instNo)
+        self.instances[shape] = paths
+        return paths
+
+    def assign(self, mesh, se, faceSet=None, faces=None):
+        ''' connects an instance of the mesh (or one of its face sets) to the
+        shadingEngine
+        @param faces: the component list of the face set e.g. ['f[0:9]'] '''
+        shape, instNo = self.paths.get(mesh, (mesh, 0))
+        plug = '%s.instObjGroups[%d]' % (shape, instNo)
+        if faceSet is not None:
+            plug += '.objectGroups[%d]' % faceSet
+            self.nodes[shape].attrs[plug.split('.', 1)[1] +
+                                    '.objectGrpCompList'] = list(faces or [])
+        index = self._memberCounts.get(se, 0)
+        self._memberCounts[se] = index + 1
+        self.connectAttr(plug, '%s.dagSetMembers[%d]' % (se, index))
+
+    def addReference(self, path, namespace):
+        ''' registers the nodes of the namespace as referenced from path, the
+        later edits of these nodes are recorded as reference edits '''
+        self.refs.append((path, namespace))
+        self.edits[namespace] = set()
+
+    def connectAttr(self, src, dst):
+        srcNode, srcAttr = self._split(src)
+        dstNode, dstAttr = self._split(dst)
+        self._edited(srcNode.name)
+        self._edited(dstNode.name)
+        srcNode.connections.append((srcAttr, dst, True))
+        dstNode.connections.append((dstAttr, src, False))
+        self._record(lambda: self.disconnectAttr(src, dst))
+
+    def disconnectAttr(self, src, dst):
+        srcNode, srcAttr = self._split(src)
+        dstNode, dstAttr = self._split(dst)
+        self._edited(srcNode.name)
+        self._edited(dstNode.name)
+        srcNode.connections.remove((srcAttr, dst, True))
+        dstNode.connections.remove((dstAttr, src, False))
+        self._record(lambda: self.connectAttr(src, dst))
+
+    # SceneBackend
+
+    def ls(self, type=None, selection=False):
+        if selection:
+            names = self.selected
+        elif type is None:
+            names = list(self.nodes)
+        else:
+            names = self.byType.get(type, [])
+        if type is not None and selection:
+            names = [n for n in names if self.nodes[n].type == type]
+        return list(names)
+
+    def objExists(self, name):
+        if '.' in name:
+            try:
+                self.getAttr(name)
+                return True
+            except ValueError:
+                return False
+        return self._resolve(name) in self.nodes
+
+    def nodeType(self, name):
+        return self._node(name).type
+
+    def getAttr(self, plug, multiIndices=False):
+        node, attr = self._split(plug)
+        if multiIndices:
+            indices = set()
+            for local, remote, isSource in node.connections:
+                if local.startswith(attr + '['):
+                    rest = local[len(attr):]
+                    indices.add(int(rest[1:rest.index(']')]))
+            return sorted(indices)
+        try:
+            return node.attrs[attr]
+        except KeyError:
+            raise ValueError('No object matches name: %s' % plug)
+
+    def setAttr(self, plug, value):
+        node, attr = self._split(plug)
+        if attr not in node.attrs:
+            raise ValueError('No object matches name: %s' % plug)
+        old = node.attrs[attr]
+        node.attrs[attr] = value
+        self._edited(node.name)
+        self._record(lambda: self.setAttr(plug, old))
+
+    def hasAttr(self, node, attr):
+        return attr in self._node(node).attrs
+
+    def addAttr(self, node, longName, attributeType='long', **kwargs):
+        node = self._node(node)
+        if longName in node.attrs:
+            self.error('Attribute %s already exists on %s' % (longName,
+                                                              node.name))
+        node.attrs[longName] = kwargs.get('dv', 0)
+        name = node.name
+        self._edited(name)
+        self._record(lambda: self.nodes[name].attrs.pop(longName))
+
+    def listConnections(self, plugs, source=True, destination=True,
+                        asPlugs=False, type=None, connections=False):
+        if isinstance(plugs, basestring):
+            plugs = [plugs]
+        result = []
+        for plug in plugs:
+            if '.' in plug:
+                node, attr = self._split(plug)
+            else:
+                node, attr = self._node(plug), None
+            for local, remote, isSource in node.connections:
+                if not (source and not isSource or
+                        destination and isSource):
+                    continue
+                if attr is not None and not (local == attr or
+                        local.startswith(attr + '[') or
+                        local.startswith(attr + '.')):
+                    continue
+                remoteNode = remote.split('.', 1)[0]
+                if type is not None and self.nodes[remoteNode].type != type:
+                    continue
+                if connections:
+                    result.append(node.name + '.' + local)
+                result.append(remote if asPlugs else remoteNode)
+        return result
+
+    def createRenderElement(self, classType, existing=None):
+        attrs = {'vrayClassType': classType}
+        if classType == 'MultiMatteElement':
+            attrs.update({'vray_name_multimatte': 'MultiMatte',
+                          'vray_usematid_multimatte': False,
+                          'vray_redid_multimatte': 0,
+                          'vray_greenid_multimatte': 0,
+                          'vray_blueid_multimatte': 0})
+        return self.createNode('VRayRenderElement', 'vrayRE_Multi_Matte',
+                               attrs)
+
+    def rename(self, node, newName):
+        node = self._node(node)
+        oldName = node.name
+        if newName == oldName:
+            return oldName
+        newName = self._uniqueName(newName)
+        del self.nodes[oldName]
+        node.name = newName
+        self.nodes[newName] = node
+        names = self.byType[node.type]
+        names[names.index(oldName)] = newName
+        for local, remote, isSource in node.connections:
+            other = self.nodes[remote.split('.', 1)[0]]
+            old = (remote[len(other.name)+1:], oldName + '.' + local,
+                   not isSource)
+            other.connections[other.connections.index(old)] = (old[0],
+                                        newName + '.' + local, not isSource)
+        if oldName in self.selected:
+            self.selected[self.selected.index(oldName)] = newName
+        self._record(lambda: self.rename(newName, oldName))
+        return newName
+
+    def delete(self, nodes):
+        for name in nodes:
+            node = self._node(name)
+            for local, remote, isSource in list(node.connections):
+                if isSource:
+                    self.disconnectAttr(node.name + '.' + local, remote)
+                else:
+                    self.disconnectAttr(remote, node.name + '.' + local)
+            self._remove(node.name)
+            self._record(lambda node=node: self._restore(node))
+
+    def selection(self):
+        return list(self.selected)
+
+    def select(self, nodes):
+        self.selected = [self._resolve(n) for n in nodes or []]
+
+    def openUndoChunk(self):
+        if not self._chunkDepth:
+            self._chunk = []
+        self._chunkDepth += 1
+
+    def closeUndoChunk(self):
+        if not self._chunkDepth:
+            return
+        self._chunkDepth -= 1
+        if not self._chunkDepth:
+            if self._chunk:
+                self.undoStack.append(self._chunk)
+            self._chunk = None
+
+    def undo(self):
+        if not self.undoStack:
+            return
+        self._replaying = True
+        try:
+            for inverse in reversed(self.undoStack.pop()):
+                inverse()
+        finally:
+            self._replaying = False
+
+    def isMaterial(self, name):
+        try:
+            return 'outColor' in self._node(name).attrs
+        except ValueError:
+            return False
+
+    def isSurfaceShader(self, name):
+        try:
+            return self._node(name).type in self.surfaceShaderTypes
+        except ValueError:
+            return False
+
+    def instanceNumber(self, mesh):
+        return self.paths.get(str(mesh), (mesh, 0))[1]
+
+    def fullPath(self, mesh):
+        return str(mesh)
+
+    def meshInstance(self, shape, instNo):
+        return self.instances.get(shape, [shape])[instNo]
+
+    def shapeInstance(self, mesh):
+        return self.paths.get(str(mesh), (str(mesh), 0))
+
+    def faceCount(self, mesh):
+        return self._node(mesh).attrs.get('faceCount', 0)
+
+    def references(self):
+        return list(self.refs)
+
+    def referenceEdits(self, path):
+        nodes = set()
+        for refPath, namespace in self.refs:
+            if refPath == path:
+                nodes.update(self.edits[namespace])
+        return list(nodes)
+
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+    # internals
+
+    def _record(self, inverse):
+        if self._replaying:
+            return
+        if self._chunk is not None:
+            self._chunk.append(inverse)
+        else:
+            self.undoStack.append([inverse])
+
+    def _edited(self, name):
+        if self.edits and not self._replaying:
+            namespace = name.rpartition(':')[0]
+            if namespace in self.edits:
+                self.edits[namespace].add(name)
+
+    def _resolve(self, name):
+        name = str(name)
+        if name in self.paths:
+            return self.paths[name][0]
+        return name
+
+    def _node(self, name):
+        try:
+            return self.nodes[self._resolve(name)]
+        except KeyError:
+            raise ValueError('No object matches name: %s' % name)
+
+    def _split(self, plug):
+        name, attr = str(plug).split('.', 1)
+        return self._node(name), attr
+
+    def _uniqueName(self, name):
+        if name not in self.nodes:
+            return name
+        base = name.rstrip('0123456789')
+        num = self._counters.get(base, 1)
+        while base + str(num) in self.nodes:
+            num += 1
+        self._counters[base] = num + 1
+        return base + str(num)
+
+    def _remove(self, name):
+        node = self.nodes.pop(name)
+        self.byType[node.type].remove(name)
+        if name in self.selected:
+            self.selected.remove(name)
+
+    def _restore(self, node):
+        self.nodes[node.name] = node
+        self.byType.setdefault(node.type, []).append(node.name)
+
+class CountingBackend(object):
+    '''
+    Wraps another backend and counts the calls made to each of its methods,
+    used to measure how many scene round trips an operation makes
+    '''
+    def __init__(self, backend):
+        self.backend = backend
+        self.counts = {}
+
+    def reset(self):
+        self.counts = {}
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        counts = self.counts
+        def _counted(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return attr(*args, **kwargs)
+        return _counted
@@ -0,0 +1,183 @@
+'''
+This module keeps track of the changes made to the maya scene that concern
+the plugin, so that the UI can update only the affected rows instead of
+rebuilding all its models.
+The watcher is Qt agnostic, it only collects the names of the dirty materials
+and mattes and notifies its owner. While it runs the attribute cache of the
+utilities module is enabled, the watcher invalidates the entries of every
+node it marks dirty.
+'''
+#--------------------------------------------
+# Name:         scene_watcher.py
+# Purpose:      Maya callbacks feeding the dirty sets of the plugin
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import maya.OpenMaya as om
+import utilities as matte_util
+
+MATERIAL_ATTRS = set(['vrayMaterialId'])
+MATTE_ATTRS = set(['vray_redid_multimatte', 'vray_greenid_multimatte',
+                   'vray_blueid_multimatte', 'vray_usematid_multimatte',
+                   'vray_name_multimatte'])
+MATTE_TYPE = 'VRayRenderElement'
+
+def isMaterialType(typeName):
+    ''' @return: True if nodes of type typeName are surface materials '''
+    classification = om.MFnDependencyNode.classification(typeName)
+    return 'shader/surface' in classification
+
+class SceneWatcher(object):
+    '''
+    Registers the OpenMaya callbacks for node addition and removal and for
+    changes in the material id and multimatte attributes. The names of the
+    affected nodes are collected in dirtyMaterials and dirtyMattes, the
+    onDirty callable is invoked (without arguments) whenever something is
+    marked dirty, it is expected to schedule a call to "takeChanges".
+    '''
+    def __init__(self, onDirty=None):
+        self.onDirty = onDirty
+        self.dirtyMaterials = set()
+        self.dirtyMattes = set()
+        self.fullRefresh = False
+        self.callbackIDs = []
+        self.nodeCallbackIDs = {}  # {MObjectHandle.hashCode(): [ids]}
+        self.watchedNames = set()  # the names given to "watchName"
+
+    def start(self, watchExisting=True):
+        ''' registers all the callbacks and starts watching the materials and
+        the multimattes already in the scene
+        @param watchExisting: if False the nodes already in the scene are not
+        watched, the owner is expected to call "watchNode" for them itself
+        (e.g. while it scans the scene)
+        '''
+        if self.callbackIDs:
+            return
+        # the nodes read through the cache are watched as they are cached,
+        # their entries are invalidated when they change
+        matte_util.enableCache(watch=self.watchName)
+        self.callbackIDs.append(om.MDGMessage.addNodeAddedCallback(
+                                            self._nodeAdded, 'dependNode'))
+        self.callbackIDs.append(om.MDGMessage.addNodeRemovedCallback(
+                                            self._nodeRemoved, 'dependNode'))
+        for msg in (om.MSceneMessage.kAfterOpen, om.MSceneMessage.kAfterNew):
+            self.callbackIDs.append(om.MSceneMessage.addCallback(msg,
+                                                    self._sceneChanged))
+        if watchExisting:
+            self.watchExisting()
+
+    def watchExisting(self):
+        ''' watches all the materials and multimattes of the scene '''
+        for node in matte_util.getAllMaterials():
+            self.watchNode(node.__apimobject__())
+        for node in matte_util.getAllMultiMattes():
+            self.watchNode(node.__apimobject__())
+
+    def stop(self):
+        ''' removes every callback registered by the watcher '''
+        for cbid in self.callbackIDs:
+            om.MMessage.removeCallback(cbid)
+        for cbids in self.nodeCallbackIDs.values():
+            for cbid in cbids:
+                om.MMessage.removeCallback(cbid)
+        self.callbackIDs = []
+        self.nodeCallbackIDs = {}
+        self.watchedNames = set()
+        matte_util.disableCache()
+
+    def watchNode(self, mobj):
+        ''' adds the attribute changed and name changed callbacks on a material
+        or multimatte node
+        '''
+        key = om.MObjectHandle(mobj).hashCode()
+        if key in self.nodeCallbackIDs:
+            return
+        self.nodeCallbackIDs[key] = [
+                om.MNodeMessage.addAttributeChangedCallback(mobj,
+                                                        self._attrChanged),
+                om.MNodeMessage.addNameChangedCallback(mobj,
+                                                        self._nameChanged)]
+
+    def watchName(self, name):
+        ''' watches the named node if it exists '''
+        if name in self.watchedNames:
+            return
+        sel = om.MSelectionList()
+        try:
+            sel.add(name)
+        except RuntimeError:
+            return
+        mobj = om.MObject()
+        sel.getDependNode(0, mobj)
+        self.watchedNames.add(name)
+        self.watchNode(mobj)
+
+    def unwatchNode(self, mobj):
+        key = om.MObjectHandle(mobj).hashCode()
+        for cbid in self.nodeCallbackIDs.pop(key, []):
+            om.MMessage.removeCallback(cbid)
+
+    def takeChanges(self):
+        ''' @return: (dirtyMaterials, dirtyMattes, fullRefresh) collected since
+        the last call and clears them
+        '''
+        changes = (self.dirtyMaterials, self.dirtyMattes, self.fullRefresh)
+        self.dirtyMaterials = set()
+        self.dirtyMattes = set()
+        self.fullRefresh = False
+        return changes
+
+    def _markDirty(self, fn, name=None):
+        name = name or fn.name()
+        matte_util.invalidate([name])
+        self.watchedNames.discard(name)
+        if fn.typeName() == MATTE_TYPE:
+            self.dirtyMattes.add(name)
+        else:
+            self.dirtyMaterials.add(name)
+        self._notify()
+
+    def _notify(self):
+        if self.onDirty is not None:
+            self.onDirty()
+
+    def _interesting(self, fn):
+        typeName = fn.typeName()
+        return typeName == MATTE_TYPE or isMaterialType(typeName)
+
+    def _nodeAdded(self, mobj, clientData):
+        fn = om.MFnDependencyNode(mobj)
+        if not self._interesting(fn):
+            return
+        self.watchNode(mobj)
+        self._markDirty(fn)
+
+    def _nodeRemoved(self, mobj, clientData):
+        fn = om.MFnDependencyNode(mobj)
+        if not self._interesting(fn):
+            return
+        self.unwatchNode(mobj)
+        self._markDirty(fn)
+
+    def _nameChanged(self, mobj, prevName, clientData):
+        fn = om.MFnDependencyNode(mobj)
+        if prevName:
+            self._markDirty(fn, prevName)
+        self._markDirty(fn)
+
+    def _attrChanged(self, msg, plug, otherPlug, clientData):
+        if not msg & (om.MNodeMessage.kAttributeSet |
+                      om.MNodeMessage.kAttributeAdded |
+                      om.MNodeMessage.kAttributeRemoved):
+            return
+        attr = plug.partialName(False, False, False, False, False, True)
+        if attr in MATERIAL_ATTRS or attr in MATTE_ATTRS:
+            self._markDirty(om.MFnDependencyNode(plug.node()))
+
+    def _sceneChanged(self, clientData):
+        matte_util.clearCache()
+        self.fullRefresh = True
+        self._notify()
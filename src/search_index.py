@@ -0,0 +1,109 @@
+"""
+The search over the rows of the models. It is kept apart from the Qt models
+so that it can be used and tested without Qt.
+"""
+#--------------------------------------------
+# Name:         search_index.py
+# Purpose:      Substring search over the terms of the rows of the models
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import bisect
+
+def searchTerms(fpn):
+    """the strings a node is found by: its short name, its full path name and
+    its namespace"""
+    return [fpn.split(":")[-1], fpn, fpn.rpartition(":")[0]]
+
+class SearchIndex(object):
+    """
+    Case insensitive substring search over the terms of the rows of a model.
+    The terms of all the rows are kept lowercased in a single string with the
+    offsets of the rows, a query is found with str.find and its matches are
+    mapped back to the rows by bisecting the offsets. A query that extends
+    the previous one (the user typing on) only filters the previous result.
+    The string is rebuilt lazily after the rows change, the result of the
+    current query is kept up to date as the rows are set and removed.
+    """
+    def __init__(self):
+        self.texts = {} #{key: lowercase terms separated with \x01}
+        self.query = ""
+        self.result = None #set of the matching keys, None matches all
+        self._corpus = None
+        self._starts = []
+        self._keys = []
+
+    def __len__(self):
+        return len(self.texts)
+
+    def set(self, key, terms):
+        text = "\x01".join([term.lower() for term in terms if term])
+        if self.texts.get(key) == text:
+            return
+        self.texts[key] = text
+        self._corpus = None
+        if self.result is not None:
+            if self.query in text:
+                self.result.add(key)
+            else:
+                self.result.discard(key)
+
+    def remove(self, key):
+        if self.texts.pop(key, None) is not None:
+            self._corpus = None
+            if self.result is not None:
+                self.result.discard(key)
+
+    def clear(self):
+        self.texts = {}
+        self._corpus = None
+        if self.result is not None:
+            self.result = set()
+
+    def _build(self):
+        self._keys = list(self.texts)
+        self._starts = []
+        offset = 0
+        for key in self._keys:
+            self._starts.append(offset)
+            offset += len(self.texts[key]) + 1
+        self._corpus = "\x00".join([self.texts[key] for key in self._keys])
+
+    def search(self, query):
+        """@return: the set of the keys of the rows matching query, None if
+        the query is empty"""
+        query = query.strip().lower()
+        if not query:
+            result = None
+        elif self.result is not None and self.query in query:
+            result = set([key for key in self.result
+                          if query in self.texts[key]])
+        else:
+            if self._corpus is None:
+                self._build()
+            if self._corpus.count(query) * 8 > len(self._keys):
+                # most of the rows match, testing them one by one is cheaper
+                # than mapping every match back to its row
+                result = set([key for key, text in self.texts.items()
+                              if query in text])
+            else:
+                result = self._find(query)
+        self.query = query
+        self.result = result
+        return result
+
+    def _find(self, query):
+        result = set()
+        find = self._corpus.find
+        starts = self._starts
+        pos = find(query)
+        while pos != -1:
+            row = bisect.bisect_right(starts, pos) - 1
+            result.add(self._keys[row])
+            if row + 1 == len(starts):
+                break
+            pos = find(query, starts[row + 1])
+        return result
@@ -3,6 +3,10 @@ This module contains the helper functions required for queres the plugin needs
 to make.
 This function will have should have no dependencies on other modules, except the
 mayas default.
+All the calls to the scene go through a scene_backend.SceneBackend, by default
+the maya scene, see "setBackend".
+The entry points can be timed together with the scene calls they make, see
+"enableProfiling".
 '''
 #--------------------------------------------
 # Name:         matteWorker.py
@@ -13,8 +17,37 @@ mayas default.
 # Copyright:    (c) ICE Animations. All rights reserved
 # Python Version:   2.6
 #--------------------------------------------
-import pymel.core as pc
-import maya.cmds as mc
+import os
+import json
+import time
+import heapq
+import bisect
+from array import array
+import scene_backend as sb
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+_backend = None
+
+def getBackend():
+    ''' @return: the SceneBackend the functions of this module talk to, a
+    MayaBackend is made on the first call if no backend has been set
+    '''
+    global _backend
+    if _backend is None:
+        _backend = sb.MayaBackend()
+    return _backend
+
+def setBackend(backend):
+    ''' makes all the functions of this module work on the given
+    SceneBackend e.g. a scene_backend.FakeScene, None goes back to maya
+    '''
+    global _backend
+    _backend = backend
+
 def undoChunk(func):
     ''' This is a decorator for all functions that cause a change in a maya
     scene. It wraps all changes of the decorated function in a single undo
@@ -27,16 +60,431 @@ def undoChunk(func):
         except KeyError:
             undoChunk = None
         if undoChunk is True:
-            pc.undoInfo(openChunk=True)
+            getBackend().openUndoChunk()
         try:
             res = func(*args, **dargs)
         finally:
             if undoChunk is False:
-                pc.undoInfo(closeChunk=True)
+                getBackend().closeUndoChunk()
             return res
     return _wrapper
 
-def materials( meshes = [] ):
+def singleUndoChunk(func):
+    ''' This is a decorator for the bulk functions that must always be undone
+    in one step, it opens an undo chunk before and closes it after the
+    decorated function regardless of the chunkOpen flag used by "undoChunk"
+    '''
+    def _wrapper(*args, **dargs):
+        dargs.pop('chunkOpen', None)
+        getBackend().openUndoChunk()
+        try:
+            return func(*args, **dargs)
+        finally:
+            getBackend().closeUndoChunk()
+    return _wrapper
+
+class Profiler(object):
+    '''
+    Records the wall time of the profiled calls (see "profiled") and the scene
+    calls made during each of them, the scene calls are counted by wrapping
+    the backend in a scene_backend.CountingBackend while profiling is on.
+
+    events: [(name, start, seconds, depth, {backend method: calls})] in the
+            order the calls returned, start is in seconds from the start of
+            the profiling, the times and the counts include the nested calls
+    '''
+    def __init__(self):
+        self.origin = time.time()
+        self.events = []
+        self.depth = 0
+        self.counter = None
+
+    def clear(self):
+        self.origin = time.time()
+        self.events = []
+
+    def _counter(self):
+        ''' @return: the CountingBackend wrapping the current backend, the
+        backend is wrapped again if it was changed by "setBackend" '''
+        scene = getBackend()
+        if scene is not self.counter:
+            self.counter = sb.CountingBackend(scene)
+            setBackend(self.counter)
+        return self.counter
+
+    def stop(self):
+        ''' puts back the backend that was wrapped '''
+        if self.counter is not None and _backend is self.counter:
+            setBackend(self.counter.backend)
+        self.counter = None
+
+    def call(self, name, func, args, dargs):
+        counter = self._counter()
+        before = dict(counter.counts)
+        start = time.time()
+        self.depth += 1
+        try:
+            return func(*args, **dargs)
+        finally:
+            self.depth -= 1
+            seconds = time.time() - start
+            calls = {}
+            for method, count in counter.counts.items():
+                count -= before.get(method, 0)
+                if count:
+                    calls[method] = count
+            self.events.append((name, start - self.origin, seconds,
+                                self.depth, calls))
+
+    def report(self):
+        '''
+        @return: {name: {'calls': number of calls, 'seconds': total time,
+        'max': longest call, 'scene': {backend method: calls}}}
+        '''
+        result = {}
+        for name, start, seconds, depth, calls in self.events:
+            entry = result.get(name)
+            if entry is None:
+                entry = result[name] = {'calls': 0, 'seconds': 0.0,
+                                        'max': 0.0, 'scene': {}}
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            for method, count in calls.items():
+                entry['scene'][method] = entry['scene'].get(method, 0) + count
+        return result
+
+    def summary(self):
+        ''' @return: the report as a human readable string, the slowest
+        operations first '''
+        report = self.report()
+        lines = ['%-40s %6s %9s %9s %7s' % ('operation', 'calls', 'total',
+                                            'max', 'scene')]
+        for name in sorted(report, key=lambda n: -report[n]['seconds']):
+            entry = report[name]
+            lines.append('%-40s %6d %8.3fs %8.3fs %7d' % (
+                            name, entry['calls'], entry['seconds'],
+                            entry['max'], sum(entry['scene'].values())))
+        return '\n'.join(lines)
+
+    def toJSON(self):
+        ''' @return: the report and the events as a json serializable
+        dictionary '''
+        return {'version': 1, 'report': self.report(),
+                'events': [{'name': name, 'start': start, 'seconds': seconds,
+                            'depth': depth, 'scene': calls}
+                           for name, start, seconds, depth, calls
+                           in self.events]}
+
+    def chromeTrace(self):
+        ''' @return: the events in the trace event format of chrome://tracing
+        and of the Perfetto UI '''
+        pid = os.getpid()
+        return {'displayTimeUnit': 'ms',
+                'traceEvents': [{'name': name, 'cat': 'matteWorks',
+                                 'ph': 'X', 'pid': pid, 'tid': 0,
+                                 'ts': start * 1e6, 'dur': seconds * 1e6,
+                                 'args': calls}
+                                for name, start, seconds, depth, calls
+                                in self.events]}
+
+    def write(self, path, chrome=False):
+        ''' writes the json report, or the chrome trace if chrome is True '''
+        data = self.toJSON()
+        if chrome:
+            data = self.chromeTrace()
+        out = open(path, 'w')
+        try:
+            json.dump(data, out)
+        finally:
+            out.close()
+
+_profiler = None
+
+def enableProfiling():
+    ''' starts recording the profiled calls
+    @return: the Profiler '''
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+def disableProfiling():
+    ''' stops recording, the profiled calls cost a single test again
+    @return: the Profiler with the recorded events, None if it was not on '''
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+def getProfiler():
+    return _profiler
+
+def profiled(func, name=None):
+    ''' This is a decorator for the entry points of the module and the
+    actions of the GUI, the calls are recorded by the Profiler while
+    profiling is enabled (see "enableProfiling"). It is used as @profiled or
+    as @profiled('Class.method') to name the recorded calls.
+    '''
+    if isinstance(func, basestring):
+        return lambda method: profiled(method, func)
+    if name is None:
+        name = func.__name__
+    def _wrapper(*args, **dargs):
+        if _profiler is None:
+            return func(*args, **dargs)
+        return _profiler.call(name, func, args, dargs)
+    _wrapper.__name__ = func.__name__
+    _wrapper.__doc__ = func.__doc__
+    return _wrapper
+
+class LRUCache(object):
+    '''
+    A mapping bounded to maxSize entries, when it is full the least recently
+    used entry is dropped. The entries are kept in a circular doubly linked
+    list of [prev, next, key, value] so every operation is O(1).
+    '''
+    def __init__(self, maxSize=20000):
+        self.maxSize = maxSize
+        self.data = {}
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        link = self.data.get(key)
+        if link is None:
+            return default
+        self._unlink(link)
+        self._append(link)
+        return link[3]
+
+    def set(self, key, value):
+        link = self.data.get(key)
+        if link is not None:
+            self._unlink(link)
+        else:
+            if len(self.data) >= self.maxSize:
+                oldest = self.root[1]
+                self._unlink(oldest)
+                del self.data[oldest[2]]
+            link = self.data[key] = [None, None, key, None]
+        link[3] = value
+        self._append(link)
+
+    def pop(self, key, default=None):
+        link = self.data.pop(key, None)
+        if link is None:
+            return default
+        self._unlink(link)
+        return link[3]
+
+    def clear(self):
+        self.data.clear()
+        self.root[:] = [self.root, self.root, None, None]
+
+    def _unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+
+    def _append(self, link):
+        last = self.root[0]
+        link[0] = last
+        link[1] = self.root
+        last[1] = self.root[0] = link
+
+# The material node handles, material ids and matte attributes are memoized
+# in _cache while it is enabled. Only enable it when something (e.g. the
+# scene_watcher) calls "invalidate" for the nodes that change or get deleted,
+# the edits made through this module keep the cache up to date themselves.
+# _cacheWatch is told the name of every node that gets an entry, so that it
+# can start watching the nodes it did not know of.
+_cache = None
+_cacheWatch = None
+_referenceCache = None
+_missing = object()
+_cacheKinds = ('material', 'id', 'class', 'matte')
+
+def enableCache(maxSize=20000, watch=None):
+    ''' @param watch: optional callable(name) called whenever an entry of
+    the node is stored, e.g. SceneWatcher.watchName '''
+    global _cache, _cacheWatch
+    if _cache is None:
+        _cache = LRUCache(maxSize)
+    _cache.maxSize = maxSize
+    _cacheWatch = watch
+
+def disableCache():
+    global _cache, _cacheWatch
+    _cache = None
+    _cacheWatch = None
+
+def setReferenceCache(cache):
+    ''' sets the reference_cache.ReferenceCache used by the SceneIndexes
+    that are not given one, None disables it '''
+    global _referenceCache
+    _referenceCache = cache
+
+def clearCache():
+    if _cache is not None:
+        _cache.clear()
+
+def invalidate(names):
+    ''' forgets everything cached about the given node names '''
+    if _cache is None:
+        return
+    for name in names:
+        for kind in _cacheKinds:
+            _cache.pop((kind, str(name)), None)
+
+def _cached(kind, name, query):
+    ''' @return: query(name) from the cache if it is enabled, the ValueErrors
+    of query are not cached '''
+    if _cache is None:
+        return query(name)
+    key = (kind, name)
+    value = _cache.get(key, _missing)
+    if value is _missing:
+        value = query(name)
+        _cache.set(key, value)
+        if _cacheWatch is not None:
+            _cacheWatch(name)
+    return value
+
+def _cacheSet(kind, name, value):
+    if _cache is not None:
+        _cache.set((kind, str(name)), value)
+        if _cacheWatch is not None:
+            _cacheWatch(str(name))
+
+# The helpers below read the scene in bulk with plain string results, the
+# node handles (PyNodes in maya) are only built for the values that are
+# returned to the callers.
+
+def _queryMaterialID(mtl):
+    try:
+        return getBackend().getAttr(mtl + '.vrayMaterialId')
+    except ValueError:
+        return None
+
+def _materialIDFromName(mtl):
+    ''' @return: the vrayMaterialId of the named material or None '''
+    return _cached('id', mtl, _queryMaterialID)
+
+def _queryMatte(matte):
+    scene = getBackend()
+    return tuple([scene.getAttr('%s.vray_%s_multimatte' % (matte, attr))
+                  for attr in ('redid', 'greenid', 'blueid', 'usematid',
+                               'name')])
+
+def _matteValues(matte):
+    ''' @return: (red, green, blue, usematid, vray_name) of the multimatte,
+    raises ValueError if matte is not a multimatte '''
+    return _cached('matte', str(matte), _queryMatte)
+
+def _renderElementClass(node):
+    try:
+        return getBackend().getAttr(node + '.vrayClassType')
+    except ValueError:
+        return None
+
+def _surfaceShaderName(se):
+    ''' @return: name of the material connected to the shadingEngine or
+    None '''
+    shaders = getBackend().listConnections(se + '.surfaceShader',
+                                           destination=False)
+    if shaders:
+        return shaders[0]
+    return None
+
+# the attributes (prefixes) of the container shaders through which their
+# sub materials are connected, e.g. coat_material_0 ... coat_material_8
+MATERIAL_SLOTS = {
+    'VRayBlendMtl': ('base_material', 'coat_material'),
+    'VRayMtl2Sided': ('frontMaterial', 'backMaterial'),
+    'VRayMtlWrapper': ('baseMaterial',),
+    'VRaySwitchMtl': ('material',),
+}
+
+class ShadingNetwork(object):
+    '''
+    Finds the materials below the shader of a shadingEngine by following the
+    material slots (see "MATERIAL_SLOTS") of the blend, two sided, wrapper and
+    switch shaders, so that the ids of the sub materials are seen as well.
+    The container shaders of the scene are listed once, the other shaders are
+    leaves and cost no query. The result of every container is memoized so
+    that the sub networks shared by many shaders are walked once.
+    '''
+    def __init__(self):
+        scene = getBackend()
+        self.containers = {}  # {node: type}
+        for nodeType in sorted(MATERIAL_SLOTS):
+            for node in scene.ls(type=nodeType):
+                self.containers[str(node)] = nodeType
+        self.memo = {}  # {container: (material, ...)}
+        self._isShader = {}
+
+    def isShader(self, node):
+        ''' @return: True if node is a surface shader, the textures and
+        utilities connected to the slots are not materials '''
+        if node not in self._isShader:
+            self._isShader[node] = getBackend().isSurfaceShader(node)
+        return self._isShader[node]
+
+    def materials(self, shader):
+        ''' @return: tuple of the shader and of all the materials below it '''
+        nodeType = self.containers.get(shader)
+        if nodeType is None:
+            return (shader,)
+        found = self.memo.get(shader)
+        if found is not None:
+            return found
+        self.memo[shader] = (shader,)  # a cycle ends here
+        found = [shader]
+        slots = MATERIAL_SLOTS[nodeType]
+        connected = getBackend().listConnections(shader, destination=False,
+                                                 connections=True)
+        for plug, node in zip(connected[::2], connected[1::2]):
+            if not plug.split('.', 1)[-1].startswith(slots):
+                continue
+            if node not in self.containers and not self.isShader(node):
+                continue
+            for mtl in self.materials(node):
+                if mtl not in found:
+                    found.append(mtl)
+        found = self.memo[shader] = tuple(found)
+        return found
+
+def _multiMatteNames(materialOnly=False):
+    ''' @return: names of all the MultiMatteElement render elements,
+    @param materialOnly: only the ones that use material ids
+    '''
+    mattes = []
+    for node in getBackend().ls(type='VRayRenderElement'):
+        if (_cached('class', node, _renderElementClass) !=
+                'MultiMatteElement'):
+            continue
+        try:
+            if materialOnly and not _matteValues(node)[3]:
+                continue
+        except ValueError:
+            continue
+        mattes.append(node)
+    return mattes
+
+def _nodes(names):
+    scene = getBackend()
+    return [scene.node(name) for name in names]
+
+@profiled
+def materials( meshes = [], index = None ):
     '''
         This function returns all the shaders/materials and material
         ids (if set) applied on meshes from a scene.
@@ -44,17 +492,22 @@ def materials( meshes = [] ):
         Arguments:
             @param meshes: The list of meshes (pymel.core.mesh) whose
             materials are needed
+            @param index: optional SceneIndex, if given the materials are
+            looked up in it instead of querying every mesh
 
         Return Type:
         A Dictionary --- {mesh:{ Id: ['Material Name', '...', ...]}}
         if material id Attribute is not set, id is None
     '''
+    if index is None:
+        # the instances sharing their assignments share the dictionary
+        return AssignmentResolver().resolve(meshes)
     mesh_materials = {}
     for mesh in meshes:
-        material = materials_helper(mesh)
-        mesh_materials[mesh] = material
+        mesh_materials[mesh] = index.meshToMaterials.get(mesh, {})
     return mesh_materials
 
+@profiled
 def materials_helper( meshNode ):
     '''
         This function returns all the shaders/materials and material
@@ -68,38 +521,426 @@ def materials_helper( meshNode ):
         A Dictionary --- {Id: ['Material Name', '...', ...]}
         if material id Attribute is not set, id is None
     '''
-    matls = {}
+    scene = getBackend()
 
-    instNo = meshNode.instanceNumber()
-    shadingEngines = set()
+    instNo = scene.instanceNumber(meshNode)
+    iog = '%s.instObjGroups[%d]' % (scene.fullPath(meshNode), instNo)
+    plugs = [iog]
     try:
-        validIndices = meshNode.iog[instNo].og.get(mi=True)
-        if validIndices:
-            for index in validIndices:
-                newSet = set(meshNode.iog[instNo].og[index].outputs(
-                                                        type='shadingEngine'))
-                shadingEngines.update(newSet)
-        shadingEngines.update(meshNode.iog[instNo].outputs(
-                                                        type='shadingEngine'))
-    except IndexError:
-        pass
-
-    for x in shadingEngines:
-        shaders = x.surfaceShader.inputs()
-        if not shaders: continue
-        try:
-            material_id = pc.getAttr(shaders[0].vrayMaterialId)
-        except AttributeError:
-            material_id = None
-        material = shaders[0]
+        validIndices = scene.getAttr(iog + '.objectGroups',
+                                     multiIndices=True)
+    except ValueError:
+        validIndices = None
+    for index in validIndices or []:
+        plugs.append('%s.objectGroups[%d]' % (iog, index))
+    shadingEngines = set(scene.listConnections(plugs, source=False,
+                                               type='shadingEngine'))
+    return _shadingEngineMaterials(shadingEngines)
+
+def _shadingEngineMaterials(shadingEngines, shaders=None, network=None):
+    ''' @param shaders: optional {shadingEngine: material name} memo
+    @param network: the ShadingNetwork finding the sub materials
+    @return: {mtlID: [material, ...]} of the shadingEngines and of the sub
+    materials of their shaders '''
+    return _materialsByID(_shadingEngineMaterialNames(shadingEngines, shaders,
+                                                      network))
 
-        if not matls.has_key(material_id):
-            matls[material_id] = [material]
+def _shadingEngineMaterialNames(shadingEngines, shaders=None, network=None):
+    ''' @return: the names of the materials of the shadingEngines and of
+    the sub materials of their shaders, see "_shadingEngineMaterials" '''
+    if network is None:
+        network = ShadingNetwork()
+    names = []
+    for se in shadingEngines:
+        if shaders is None:
+            shader = _surfaceShaderName(se)
+        elif se in shaders:
+            shader = shaders[se]
         else:
-            if material not in matls[material_id]:
-                matls[material_id].append(material)
+            shader = shaders[se] = _surfaceShaderName(se)
+        if shader is None: continue
+        for mtl in network.materials(shader):
+            if mtl not in names:
+                names.append(mtl)
+    return names
+
+def _materialsByID(names, nodes=None):
+    ''' @param nodes: optional {material name: node} memo
+    @return: {mtlID: [material, ...]} with the current ids of the materials '''
+    scene = getBackend()
+    if nodes is None:
+        nodes = {}
+    matls = {}
+    for mtl in names:
+        material = nodes.get(mtl)
+        if material is None:
+            material = nodes[mtl] = scene.node(mtl)
+        matls.setdefault(_materialIDFromName(mtl), []).append(material)
     return matls
 
+class AssignmentResolver(object):
+    '''
+    Resolves the materials of many mesh instances with the lookups shared
+    between them. The instObjGroups connections of a shape are read once for
+    all its dag instances, and the instances connected to the same set of
+    shadingEngines (the connection signature) are resolved once. In set
+    dressing scenes thousands of instances of a few hundred shapes share a
+    handful of signatures.
+    Only the names of the materials are kept, their ids are read when asked
+    for so that they are never stale.
+
+    shapes:     {shape: {instNo: signature}} the shapes read so far
+    signatures: {signature: (material name, ...)} a signature is the
+                frozenset of the shadingEngines of an instance (whole object
+                and face sets)
+    connections:{shape: [(instObjGroups plug, shadingEngine)]} kept for the
+                face tables, see "faces"
+
+    The results are kept until "clear" is called.
+    '''
+    def __init__(self):
+        self.shapes = {}
+        self.signatures = {}
+        self.shaders = {}  # {shadingEngine: material name}
+        self.connections = {}
+        self.faceTables = {}  # {(shape, instNo): {material name: FaceRuns}}
+        self.nodes = {}  # {material name: node}
+        self.network = None
+
+    def clear(self):
+        getBackend().clearCaches()
+        self.shapes.clear()
+        self.signatures.clear()
+        self.shaders.clear()
+        self.connections.clear()
+        self.faceTables.clear()
+        self.nodes.clear()
+        self.network = None
+
+    def forget(self, shapes):
+        ''' drops what was read of the shapes, they are read again when next
+        resolved
+        @param shapes: the shapes as returned by the backend "shapeInstance",
+        they need not exist any more '''
+        for shape in shapes:
+            self.shapes.pop(shape, None)
+            self.connections.pop(shape, None)
+            for key in [key for key in self.faceTables if key[0] == shape]:
+                del self.faceTables[key]
+
+    def _network(self):
+        if self.network is None:
+            self.network = ShadingNetwork()
+        return self.network
+
+    def _signatures(self, shape):
+        signatures = self.shapes.get(shape)
+        if signatures is None:
+            instances = {}
+            found = getBackend().listConnections(shape + '.instObjGroups',
+                            source=False, type='shadingEngine',
+                            connections=True)
+            pairs = self.connections[shape] = list(zip(found[::2],
+                                                       found[1::2]))
+            for plug, se in pairs:
+                instances.setdefault(_instanceNumber(plug), set()).add(se)
+            signatures = self.shapes[shape] = dict([
+                        (instNo, frozenset(ses))
+                        for instNo, ses in instances.items()])
+        return signatures
+
+    def signature(self, mesh):
+        ''' @return: the frozenset of the shadingEngines of the instance '''
+        shape, instNo = getBackend().shapeInstance(mesh)
+        return self._signatures(shape).get(instNo, frozenset())
+
+    def materialNames(self, mesh):
+        ''' @return: tuple of the names of the materials of the instance '''
+        signature = self.signature(mesh)
+        names = self.signatures.get(signature)
+        if names is None:
+            names = self.signatures[signature] = tuple(
+                    _shadingEngineMaterialNames(sorted(signature), self.shaders,
+                                                self._network()))
+        return names
+
+    def resolve(self, meshes):
+        ''' @return: {mesh: {mtlID: [material, ...]}} with the current ids,
+        the instances of a signature share the same dictionary which must not
+        be modified '''
+        result = {}
+        byNames = {}
+        for mesh in meshes:
+            names = self.materialNames(mesh)
+            matls = byNames.get(names)
+            if matls is None:
+                matls = byNames[names] = _materialsByID(names, self.nodes)
+            result[mesh] = matls
+        return result
+
+    def _shader(self, se):
+        if se not in self.shaders:
+            self.shaders[se] = _surfaceShaderName(se)
+        return self.shaders[se]
+
+    def faces(self, mesh):
+        '''
+        the component mode: the faces of the instance covered by each of its
+        materials, read from the component lists of the face sets (e.g.
+        ['f[0:99]', 'f[120]']) without making a component per face
+        @return: {material name: FaceRuns}
+        '''
+        scene = getBackend()
+        shape, instNo = scene.shapeInstance(mesh)
+        table = self.faceTables.get((shape, instNo))
+        if table is not None:
+            return table
+        self._signatures(shape)
+        table = {}
+        faceCount = None
+        for plug, se in self.connections[shape]:
+            if _instanceNumber(plug) != instNo:
+                continue
+            shader = self._shader(se)
+            if shader is None:
+                continue
+            if faceCount is None:
+                faceCount = scene.faceCount(mesh)
+            if '.objectGroups[' in plug:
+                try:
+                    components = scene.getAttr(plug + '.objectGrpCompList')
+                except ValueError:
+                    continue
+                runs = FaceRuns.fromComponents(components, faceCount)
+            else:
+                runs = FaceRuns([0, faceCount - 1])
+            # the sub materials cover the faces of their shader
+            for mtl in self._network().materials(shader):
+                if mtl in table:
+                    table[mtl] = table[mtl].union(runs)
+                else:
+                    table[mtl] = runs
+        self.faceTables[(shape, instNo)] = table
+        return table
+
+class FaceRuns(object):
+    '''
+    A set of face indices stored as sorted and disjoint runs in an array('i')
+    of [first, last, first, last, ...] (last included), the memory used is
+    proportional to the number of runs and not to the number of faces.
+
+    @param runs: flat list of the first and last faces of the runs, they are
+    sorted and merged
+    '''
+    __slots__ = ('runs',)
+
+    def __init__(self, runs=None):
+        pairs = []
+        if runs:
+            pairs = sorted(zip(runs[::2], runs[1::2]))
+        merged = array('i')
+        for first, last in pairs:
+            if last < first:
+                continue
+            if merged and first <= merged[-1] + 1:
+                merged[-1] = max(merged[-1], last)
+            else:
+                merged.append(first)
+                merged.append(last)
+        self.runs = merged
+
+    @classmethod
+    def fromComponents(cls, components, faceCount=0):
+        ''' @param components: the component strings of maya e.g.
+        ['f[0:99]', 'f[120]', 'mesh.f[*]'], the ones that are not faces are
+        ignored
+        @param faceCount: the number of faces of the mesh, for 'f[*]' '''
+        runs = []
+        for component in components or []:
+            name, sep, indices = str(component).rpartition('f[')
+            if not sep or (name and not name.endswith('.')):
+                continue
+            indices = indices.rstrip(']')
+            if indices == '*':
+                runs += [0, faceCount - 1]
+                continue
+            first, sep, last = indices.partition(':')
+            try:
+                runs += [int(first), int(last or first)]
+            except ValueError:
+                continue
+        return cls(runs)
+
+    def __iter__(self):
+        ''' iterates over the (first, last) runs '''
+        runs = self.runs
+        return iter(zip(runs[::2], runs[1::2]))
+
+    def __contains__(self, face):
+        pos = bisect.bisect_right(self.runs, face)
+        return pos % 2 == 1 or (pos and self.runs[pos - 1] == face)
+
+    def __eq__(self, other):
+        return isinstance(other, FaceRuns) and self.runs == other.runs
+
+    def __ne__(self, other):
+        return not self == other
+
+    def runCount(self):
+        return len(self.runs) // 2
+
+    def count(self):
+        ''' @return: the number of faces '''
+        return sum([last - first + 1 for first, last in self])
+
+    def union(self, other):
+        return FaceRuns(list(self.runs) + list(other.runs))
+
+    def components(self, mesh):
+        ''' @return: the component names of the faces of the mesh for the
+        selection e.g. ['meshShape.f[0:99]', 'meshShape.f[120]'] '''
+        result = []
+        for first, last in self:
+            if first == last:
+                result.append('%s.f[%d]' % (mesh, first))
+            else:
+                result.append('%s.f[%d:%d]' % (mesh, first, last))
+        return result
+
+def _instanceNumber(plug):
+    ''' extracts the dag instance number from the name of an instObjGroups
+    plug e.g. 'meshShape.instObjGroups[1].objectGroups[0]' gives 1
+    '''
+    try:
+        return int(str(plug).split('[', 1)[1].split(']', 1)[0])
+    except (IndexError, ValueError):
+        return 0
+
+class SceneIndex(object):
+    '''
+    A single pass index of all the material assignments in the scene.
+    The shadingEngines are walked once (shadingEngine -> surfaceShader and
+    shadingEngine -> mesh instance / face set) and the inverted maps are built
+    so that the queries about ids, materials and meshes can be answered with
+    dictionary lookups.
+
+    idToMaterials:      {mtlID: [material, ...]}, mtlID is None if not set
+    materialToID:       {material: mtlID}
+    materialToMeshes:   {material: set([mesh, ...])}
+    meshToMaterials:    {mesh: {mtlID: [material, ...]}} same as "materials()"
+    shadingEngines:     {shadingEngine: (material name, mtlID,
+                                         [(shape, instNo), ...])}
+
+    The materials below the shaders of blend, two sided, wrapper and switch
+    shaders (see "ShadingNetwork") are indexed as assigned to the meshes of
+    their shaders.
+
+    @param cache: optional reference_cache.ReferenceCache, the shadingEngines
+    of the references it has tables for are taken from it, see "build"
+    '''
+    def __init__(self, cache=None):
+        if cache is None:
+            cache = _referenceCache
+        self.cache = cache
+        self.idToMaterials = {}
+        self.materialToID = {}
+        self.materialToMeshes = {}
+        self.meshToMaterials = {}
+        self.shadingEngines = {}
+        self.build()
+
+    @profiled('SceneIndex.build')
+    def build(self):
+        ''' (re)walks the scene and fills the maps, the cache (if any) fills
+        in the shadingEngines of the cached references first and is updated
+        with the references it missed at the end '''
+        self.idToMaterials.clear()
+        self.materialToID.clear()
+        self.materialToMeshes.clear()
+        self.meshToMaterials.clear()
+        self.shadingEngines.clear()
+        self._materials = {}
+        self._meshes = {}
+
+        scene = getBackend()
+        scene.clearCaches()
+        cached = set()
+        if self.cache is not None:
+            cached = self.cache.fill(self)
+        for se in scene.ls(type='shadingEngine'):
+            if se in cached:
+                continue
+            shader = _surfaceShaderName(se)
+            if shader is None: continue
+            members = [(plug.split('.', 1)[0], _instanceNumber(plug))
+                       for plug in scene.listConnections(se + '.dagSetMembers',
+                                destination=False, asPlugs=True, type='mesh')]
+            self.addShadingEngine(se, shader, members)
+        if self.cache is not None:
+            self.cache.update(self.shadingEngines)
+        self.addSubMaterials(ShadingNetwork())
+
+    def addSubMaterials(self, network):
+        ''' adds the sub materials found by the ShadingNetwork below the
+        shaders of the shadingEngines '''
+        scene = getBackend()
+        for se, (shader, mtlID, members) in list(self.shadingEngines.items()):
+            for sub in network.materials(shader):
+                if sub == shader:
+                    continue
+                material = self._materials.get(sub)
+                if material is None:
+                    material = self._materials[sub] = scene.node(sub)
+                    self._addMaterial(material, _materialIDFromName(sub))
+                for key in members:
+                    self._addAssignment(self._meshes[key], material)
+
+    def addShadingEngine(self, se, shader, members, mtlID=_missing):
+        '''
+        adds the assignments of a shadingEngine to the maps
+        @param shader: name of the material of the shadingEngine
+        @param members: [(shape, instNo)] of the mesh instances of the set
+        @param mtlID: the id of the material, queried if not given
+        '''
+        scene = getBackend()
+        material = self._materials.get(shader)
+        if material is None:
+            material = self._materials[shader] = scene.node(shader)
+            if mtlID is _missing:
+                mtlID = _materialIDFromName(shader)
+            self._addMaterial(material, mtlID)
+        self.shadingEngines[se] = (shader, self.materialToID[material],
+                                   members)
+        for key in members:
+            mesh = self._meshes.get(key)
+            if mesh is None:
+                mesh = self._meshes[key] = scene.meshInstance(*key)
+            self._addAssignment(mesh, material)
+
+    def _addMaterial(self, material, mtlID):
+        if material in self.materialToID:
+            return
+        self.materialToID[material] = mtlID
+        self.materialToMeshes[material] = set()
+        self.idToMaterials.setdefault(mtlID, []).append(material)
+
+    def _addAssignment(self, mesh, material):
+        self.materialToMeshes[material].add(mesh)
+        matls = self.meshToMaterials.setdefault(mesh, {})
+        mtls = matls.setdefault(self.materialToID[material], [])
+        if material not in mtls:
+            mtls.append(material)
+
+    def materials(self):
+        ''' @return: list of all the indexed materials '''
+        return list(self.materialToID)
+
+    def meshes(self, material):
+        ''' @return: list of meshes (instances) the material is assigned to
+        '''
+        return list(self.materialToMeshes.get(material, ()))
+
+@profiled
 def mtlToMatte(materials = []):
     '''
     This function is used to get the multimattes in accordance with the objects
@@ -110,27 +951,20 @@ def mtlToMatte(materials = []):
                     at this stage)
     @return: a dictionary of multimattes {name: [mtlID]}
     '''
-    multimattes_list = getAllMultiMattes()
     used_multimattes = {}
 
-    for matte in multimattes_list:
-        #check if the "use material id" checkBox is checked
-        use_material_id = pc.getAttr(matte + ".vray_usematid_multimatte")
-        if use_material_id:
-            greenid = pc.getAttr(matte + ".vray_greenid_multimatte")
-            redid = pc.getAttr(matte + ".vray_redid_multimatte")
-            blueid = pc.getAttr(matte + ".vray_blueid_multimatte")
-            multimatte_name = pc.getAttr(matte + ".vray_name_multimatte")
-
-            for mat_id in materials:
-                if mat_id == greenid or mat_id == redid or mat_id == blueid:
-                    if not used_multimattes.has_key(multimatte_name):
-                        used_multimattes[multimatte_name] = [mat_id]
-                    else:
-                        if mat_id not in used_multimattes[multimatte_name]:
-                            used_multimattes[multimatte_name].append(mat_id)
+    #only the mattes with the "use material id" checkBox checked
+    for matte in _multiMatteNames(materialOnly=True):
+        redid, greenid, blueid, use, multimatte_name = _matteValues(matte)
+
+        for mat_id in materials:
+            if mat_id == greenid or mat_id == redid or mat_id == blueid:
+                ids = used_multimattes.setdefault(multimatte_name, [])
+                if mat_id not in ids:
+                    ids.append(mat_id)
     return used_multimattes
 
+@profiled
 def matteToMtlID(matte = []):
     '''
     Query the given list of matte and return the list of materials it contains
@@ -140,73 +974,204 @@ def matteToMtlID(matte = []):
     '''
     mattes = {}
     for m in matte:
-        redid = pc.getAttr(m+ ".vray_redid_multimatte")
-        greenid = pc.getAttr(m+ ".vray_greenid_multimatte")
-        blueid = pc.getAttr(m+ ".vray_blueid_multimatte")
+        redid, greenid, blueid, use, name = _matteValues(m)
 
-        if pc.getAttr(m.vray_usematid_multimatte) == True:
+        if use == True:
             mattes[m] = [redid, greenid, blueid]
         else:
             mattes[m] = None
     return mattes
 
-def mtlNameFromId(mtlID = []):
+@profiled
+def mtlNameFromId(mtlID = [], index = None):
     '''
     Queries materials containing the following IDs
     @param mtID: list of mtlID
+    @param index: SceneIndex to answer from, a new one is built if not given
     @return: {mtlID:[mtlNames], mtlID:None}
-    This fuction uses the services of "materials()"
     '''
-    #If the given mtlID doesn't exist return empty list
+    #If the given mtlID doesn't exist return None
+    if index is None:
+        index = SceneIndex()
     mat_names = {}
-    meshes = pc.ls(type = 'mesh')
-    for mesh in meshes:
-        all_materials = materials_helper(mesh)
-        for mat_id in mtlID:
-            if mat_id in all_materials:
-                mat_names[mat_id] = all_materials[mat_id]
-            else:
-                mat_names[mat_id] = None
+    for mat_id in mtlID:
+        mat_names[mat_id] = index.idToMaterials.get(mat_id)
     return mat_names
 
 @undoChunk
+@profiled
 def createMatte(red = 0, green = 0, blue = 0):
     '''
     Create matte with the given ID
     @param red: materialID
     @param green:
-    This function uses the services of "getAllMattes()" and
-    "getNewlyCreatedMultiMattes"
+    This function uses the services of "_addMultiMatte"
     '''
 
     # create the new multimatte
-    prevList = getAllMultiMattes()
-    pc.Mel.eval("vrayAddRenderElement MultiMatteElement")
-    newList = getAllMultiMattes()
-    matte = getNewlyCreatedMultiMattes(prevList, newList)[0]
+    scene = getBackend()
+    matte = scene.createRenderElement('MultiMatteElement')
+
+    scene.setAttr(matte+ ".vray_redid_multimatte", int(red))
+    scene.setAttr(matte+ ".vray_greenid_multimatte", int(green))
+    scene.setAttr(matte+ ".vray_blueid_multimatte", int(blue))
+    invalidate([matte])
+
+@singleUndoChunk
+@profiled
+def createMultiMattes(mtlIDs = [], names = []):
+    '''
+    Creates one material multimatte for every id triplet in a single undo
+    chunk, the user selection is saved and restored only once for the batch
+    @param mtlIDs: [[R[, G[, B]]], ...] material ids of the mattes
+    @param names: optional list of names for the mattes, the name of the matte
+    is also set as its vray_name_multimatte
+    @return: list of PyNodes of the new mattes
+    '''
+    scene = getBackend()
+    sel = scene.selection()
+    existing = set(scene.ls(type='VRayRenderElement'))
+    newMattes = []
+    try:
+        for num, ids in enumerate(mtlIDs):
+            newMatte = scene.createRenderElement('MultiMatteElement',
+                                                 existing)
+            existing.add(newMatte)
+            invalidate([newMatte])
+
+            # give good materials IDs to the matte
+            scene.setAttr(newMatte + '.vray_usematid_multimatte', True)
+            for attr, mtlID in zip(('.vray_redid_multimatte',
+                                    '.vray_greenid_multimatte',
+                                    '.vray_blueid_multimatte'), ids):
+                scene.setAttr(newMatte + attr, int(mtlID))
 
-    pc.setAttr(matte+ ".vray_redid_multimatte", int(red))
-    pc.setAttr(matte+ ".vray_greenid_multimatte", int(green))
-    pc.setAttr(matte+ ".vray_blueid_multimatte", int(blue))
+            if num < len(names) and names[num]:
+                newMatte = scene.rename(newMatte, names[num])
+                invalidate([newMatte])
+                scene.setAttr(newMatte + '.vray_name_multimatte', newMatte)
+            newMattes.append(newMatte)
+    finally:
+        scene.select(sel)
+    return _nodes(newMattes)
 
-def mtlExists(mtlID=[]):
+@profiled
+def mtlExists(mtlID=[], index = None):
     '''
     Queries if the given list of material IDs exist
     @param mtlID: list of material Id
+    @param index: SceneIndex to answer from, a new one is built if not given
     @return: {mtlID: False|True}
-    This function uses the services of "materials()"
     '''
+    if index is None:
+        index = SceneIndex()
     mat_exist = {}
-    meshes = pc.ls(type = 'mesh')
-    for mesh in meshes:
-        all_materials = materials_helper(mesh)
-        for mat_id in mtlID:
-            if mat_id in all_materials:
-                mat_exist[mat_id] = True
-            else:
-                mat_exist[mat_id] = False
+    for mat_id in mtlID:
+        mat_exist[mat_id] = mat_id in index.idToMaterials
     return mat_exist
 
+class MaterialIDAllocator(object):
+    '''
+    Hands out the lowest unused material ids. The ids in use are read from the
+    scene only once, after that the allocator is kept up to date through
+    "assign" whenever an id is set on (or removed from) a material, so
+    allocating ids for n materials costs O(n log n) instead of n full scene
+    scans.
+    '''
+    def __init__(self, includeZero=False, materialIDs=None):
+        '''
+        @param includeZero if True 0 is considered a valid unique id
+        @param materialIDs {material name: mtlID} in use, if None they are read
+        from the parent materials of all the shadingEngines in the scene
+        '''
+        self.start = int(not includeZero)
+        if materialIDs is None:
+            materialIDs = self._sceneMaterialIDs()
+        self.mtlToID = {}
+        self.counts = {}
+        self._free = []
+        self._next = self.start
+        for mtl, mtlID in materialIDs.items():
+            self.assign(mtl, mtlID)
+
+    def _sceneMaterialIDs(self):
+        mtlIDs = {}
+        network = ShadingNetwork()
+        for se in getBackend().ls(type='shadingEngine'):
+            sn = _surfaceShaderName(se)
+            if sn is None:
+                continue
+            for mtl in network.materials(sn):
+                if mtl in mtlIDs:
+                    continue
+                mtlID = _materialIDFromName(mtl)
+                if mtlID is not None:
+                    mtlIDs[mtl] = mtlID
+        return mtlIDs
+
+    def isUsed(self, mtlID):
+        return self.counts.get(mtlID, 0) > 0
+
+    def lowest(self):
+        ''' @return: the lowest id not used by any material, the id is not
+        reserved until it is assigned to a material '''
+        while self._free and self.isUsed(self._free[0]):
+            heapq.heappop(self._free)
+        if self._free:
+            return self._free[0]
+        while self.isUsed(self._next):
+            self._next += 1
+        return self._next
+
+    def allocate(self, mtl):
+        ''' assigns the lowest unused id to the material and returns it '''
+        mtlID = self.lowest()
+        self.assign(mtl, mtlID)
+        return mtlID
+
+    def assign(self, mtl, mtlID):
+        ''' records that material mtl now has mtlID (None if the material
+        has no id anymore) freeing its previous id if no one else uses it
+        '''
+        mtl = str(mtl)
+        oldID = self.mtlToID.get(mtl)
+        if oldID == mtlID and mtl in self.mtlToID:
+            return
+        self.mtlToID[mtl] = mtlID
+        if mtlID is not None:
+            self.counts[mtlID] = self.counts.get(mtlID, 0) + 1
+        if oldID is not None:
+            self.counts[oldID] -= 1
+            if not self.counts[oldID]:
+                del self.counts[oldID]
+                if self.start <= oldID < self._next:
+                    heapq.heappush(self._free, oldID)
+
+_idAllocator = None
+
+def allocatesIDs(func):
+    ''' This is a decorator for functions that assign many material ids. It
+    keeps a single MaterialIDAllocator alive while the function runs so that
+    the nested getLowestUniqueID calls do not rescan the scene, the allocator
+    is only made (and the scene scanned) by the first of these calls
+    '''
+    def _wrapper(*args, **dargs):
+        global _idAllocator
+        if _idAllocator is not None:
+            return func(*args, **dargs)
+        _idAllocator = _missing
+        try:
+            return func(*args, **dargs)
+        finally:
+            _idAllocator = None
+    return _wrapper
+
+def _allocatorAssign(mtl, mtlID):
+    # before the allocator is made the ids written are read by its scan
+    if _idAllocator is not None and _idAllocator is not _missing:
+        _idAllocator.assign(mtl, mtlID)
+
+@profiled
 def getLowestUniqueID(includeZero=False):
     ''' fetches all the material ids from the parent materials in the scene and
     find the smallest id integer that has not been used
@@ -215,23 +1180,111 @@ def getLowestUniqueID(includeZero=False):
     this value is false since vray considers 0 as a 'non-ID' and does not
     render materials having to any matte
     '''
-    ses=pc.ls(type='shadingEngine')
-    mtlIDs = set()
-    for se in ses:
-        try:
-            sn = se.surfaceShader.inputs()[0]
-            mtlIDs.add(sn.vrayMaterialId.get())
-        except IndexError:
-            continue
-        except AttributeError:
-            continue
+    global _idAllocator
+    if _idAllocator is _missing:
+        _idAllocator = MaterialIDAllocator(includeZero)
+        return _idAllocator.lowest()
+    if _idAllocator is not None and _idAllocator.start == int(not includeZero):
+        return _idAllocator.lowest()
+    return MaterialIDAllocator(includeZero).lowest()
 
-    start = int(not includeZero)
-    allids = set(range(start, max(mtlIDs)+2))
-    unused = allids.difference(mtlIDs)
-    return unused.pop()
+class MaterialIDReport(object):
+    '''
+    A scene wide check of the material ids, built in one pass over the
+    materials of all the shadingEngines. The materials with the same name in
+    different namespaces (the references of the same asset) are expected to
+    share their id, the other materials sharing an id are conflicts.
 
-@undoChunk
+    idToMaterials:  {mtlID: [material names]} of the materials with an id
+    conflicts:      {mtlID: [[material names], ...]} the ids shared by
+                    unrelated materials, grouped by the name of the material
+                    without its namespace
+    missing:        [material names] without an id (or with 0)
+    '''
+    def __init__(self):
+        self.mtlToID = {}
+        self.idToMaterials = {}
+        self.conflicts = {}
+        self.missing = []
+        self.build()
+
+    @profiled('MaterialIDReport.build')
+    def build(self):
+        mtls = _sceneMaterialNames()
+        self.mtlToID = {}
+        self.idToMaterials = {}
+        self.missing = []
+        for mtl in sorted(mtls):
+            mtlID = _materialIDFromName(mtl)
+            if not mtlID:
+                self.missing.append(mtl)
+                continue
+            self.mtlToID[mtl] = mtlID
+            self.idToMaterials.setdefault(mtlID, []).append(mtl)
+        self.conflicts = {}
+        for mtlID, names in self.idToMaterials.items():
+            groups = self._groups(names)
+            if len(groups) > 1:
+                self.conflicts[mtlID] = groups
+
+    def _groups(self, mtls):
+        ''' @return: the materials grouped by their name without namespace,
+        the biggest group first '''
+        groups = {}
+        for mtl in mtls:
+            groups.setdefault(mtl.split(':')[-1], []).append(mtl)
+        return sorted(groups.values(), key=lambda group: (-len(group),
+                                                          group[0]))
+
+    def isClean(self):
+        return not (self.conflicts or self.missing)
+
+    def report(self):
+        ''' @return: the findings as a human readable string '''
+        lines = []
+        for mtlID in sorted(self.conflicts):
+            lines.append('id %d is shared by %s' % (mtlID, ', '.join(
+                        [' '.join(group) for group in self.conflicts[mtlID]])))
+        for mtl in self.missing:
+            lines.append('%s has no id' % mtl)
+        if not lines:
+            lines.append('%d materials, no conflicts' % len(self.mtlToID))
+        return '\n'.join(lines)
+
+    def plan(self, fixMissing=True):
+        '''
+        the biggest group of every conflict keeps its id, the other groups and
+        the materials without ids get the lowest free ids, one id per group
+        @return: {material name: new id}
+        '''
+        allocator = MaterialIDAllocator(materialIDs=self.mtlToID)
+        groups = []
+        for mtlID in sorted(self.conflicts):
+            groups.extend(self.conflicts[mtlID][1:])
+        if fixMissing:
+            groups.extend(self._groups(self.missing))
+        mtlIDs = {}
+        for group in groups:
+            newID = allocator.allocate(group[0])
+            for mtl in group:
+                mtlIDs[mtl] = newID
+        return mtlIDs
+
+    @profiled('MaterialIDReport.fix')
+    def fix(self, fixMissing=True):
+        ''' applies the plan in a single undo chunk
+        @return: {material: id that was set} '''
+        written = setMaterialIDs(self.plan(fixMissing))
+        self.build()
+        return written
+
+def _matteShortName(mtl):
+    ''' the part of the material name used in the name of its matte '''
+    return str(mtl).split(':')[-1].split('_')[0]
+
+@singleUndoChunk
+@allocatesIDs
+@profiled
 def makeMtlMatte(mtlNames = []):
     ''' This function takes a list of materials and creates multimattes from
     them taking care that none of the material IDs are repeated
@@ -247,28 +1300,26 @@ def makeMtlMatte(mtlNames = []):
         i = getMaterialID(mtl, createNewID=True)
         if not i:
             i = getLowestUniqueID()
-            _setMaterialID(mtlName, i)
-        if i in mtlIDs:
-            mtlID_dict[i].append(mtlName)
+            _setMaterialID(mtl, i)
+        if i in mtlID_dict:
+            mtlID_dict[i].append(mtl)
         else:
             mtlIDs.append(i)
-            mtlID_dict[i] = [mtlName]
-
-    # print 'mtlIDs=', mtlIDs, 'mtlID_dict=', mtlID_dict
-
-    # call the helper as many times as required providing
-    # one material for one id
-    # providing three materials for each matte
-    numMtlIDs = len(mtlIDs)
-    newmattes = []
+            mtlID_dict[i] = [mtl]
 
-    for matteOffset in range(0, numMtlIDs, 3):
-        mat3 = []
-        for index in range(matteOffset, min(matteOffset+3, numMtlIDs)):
-            mat3.append(mtlID_dict[mtlIDs[index]][0])
-        newmattes.append(_makeMtlMatte(mat3))
+    # one material for one id and three ids for each matte, all the mattes
+    # are then created in a single batch
+    triplets = []
+    names = []
+    for matteOffset in range(0, len(mtlIDs), 3):
+        ids = mtlIDs[matteOffset:matteOffset+3]
+        triplets.append(ids)
+        names.append('_'.join([_matteShortName(mtlID_dict[i][0])
+                               for i in ids]) + '_matte')
 
-    return newmattes
+    if not triplets:
+        return []
+    return createMultiMattes(triplets, names)
 
 @undoChunk
 def _makeMtlMatte(mtlNames = []):
@@ -282,7 +1333,7 @@ def _makeMtlMatte(mtlNames = []):
     # create a New material matte and give the ids of the first three
     # materials, make sure the useMaterial IDs are checked
 
-    if not mtlNames: pc.error('No material names were passed')
+    if not mtlNames: getBackend().error('No material names were passed')
 
     mtlShortNames = []
     mtlIDs = []
@@ -291,38 +1342,17 @@ def _makeMtlMatte(mtlNames = []):
         # check if there are valid materials in input
         mtl = mayaMaterial( mtlName )
         if mtl is None:
-            pc.error("Provided object %s is not a valid material" % mtlName)
+            getBackend().error("Provided object %s is not a valid material"
+                                                                    % mtlName)
 
-        shortName = mtl.split(':')[-1].split('_')[0]
-        mtlShortNames.append( shortName )
+        mtlShortNames.append( _matteShortName(mtl) )
 
         # see if materials have material ids attached to them
         # else give lowest unique id
         mtlIDs.append(getMaterialID(mtl, createNewID=True))
-    # print 'mtlIDs inner', mtlIDs
 
-    sel = pc.ls(sl=1)
-    # create the new multimatte
-    prevList = getAllMultiMattes()
-    pc.Mel.eval("vrayAddRenderElement MultiMatteElement")
-    newList = getAllMultiMattes()
-    newMatte = getNewlyCreatedMultiMattes(prevList, newList)[0]
-    pc.select(sel)
-
-    # give good materials IDs to the matte
-    newMatte.vray_usematid_multimatte.set(True)
-    newMatte.vray_redid_multimatte.set(mtlIDs[0])
-    if len(mtlIDs) > 1:
-        newMatte.vray_greenid_multimatte.set(mtlIDs[1])
-    if len(mtlIDs) > 2:
-        newMatte.vray_blueid_multimatte.set(mtlIDs[2])
-
-    # give appropriate name to matte (by extracting from material name)
     newMatteName = '_'.join(mtlShortNames) + '_matte'
-    newMatteName = pc.rename( newMatte,  newMatteName )
-    newMatte.vray_name_multimatte.set(str(newMatteName))
-
-    return newMatte
+    return createMultiMattes([mtlIDs], [newMatteName])[0]
 
 def getNewlyCreatedMultiMattes(prevList, newList):
     ''' returns the difference newList - prevList
@@ -333,53 +1363,43 @@ def getNewlyCreatedMultiMattes(prevList, newList):
             newMMs.append(j)
     return newMMs
     '''
-    return [j for j in newList if j not in prevList]
+    prevSet = set(prevList)
+    return [j for j in newList if j not in prevSet]
 
+@profiled
 def getAllMaterialMultiMattes():
     ''' returns the list of Pynode objects of all multimatte
     (vrayRenderElementNodes) nodes which use material ids i.e. there attribute
     vray_usematid_multimatte has been set to a True value
-
-    multimattes = getAllMultiMattes()
-    matmultimattes = []
-    for mm in multimattes:
-        if mm.vray_usematid_multimatte.get():
-            matmultimattes.append(mm)
-    return matmultimattes
     '''
-    return [mm for mm in getAllMultiMattes()
-            if mm.vray_usematid_multimatte.get()]
+    return _nodes(_multiMatteNames(materialOnly=True))
 
+@profiled
 def getAllMultiMattes():
     '''
     @return: the list of pynode objects of all multimatte
     (vrayRenderElementNodes) nodes
     '''
-    vrayres = pc.ls(type = 'VRayRenderElement')
-    multimattes = []
-    for node in vrayres:
-        try:
-            if node.vrayClassType.get() == 'MultiMatteElement':
-                multimattes.append(node)
-        except AttributeError:
-            pass
-    return multimattes
+    return _nodes(_multiMatteNames())
 
 def mayaMaterial(mtl):
     ''' if the argument is a valid maya material it returns a PyNode else it
     returns None
     '''
-    try:
-        mtl = pc.PyNode(mtl)
-        if callable(mtl.outColor.get):
-            return mtl
-    except pc.MayaNodeError:
-        pass
-    except AttributeError:
-        pass
+    return _cached('material', str(mtl), _queryMaterial)
+
+def _queryMaterial(mtl):
+    scene = getBackend()
+    if scene.isMaterial(mtl):
+        return scene.node(mtl)
     return None
 
+def _addMaterialIDAttr(mtl):
+    getBackend().addAttr(str(mtl), 'vrayMaterialId', 'long', keyable=False,
+            min=0, smx=10, readable=True, storable=True, writable=True, dv=0)
+
 @undoChunk
+@profiled
 def setMaterialID(mtls, newid):
     ''' @material
     '''
@@ -387,33 +1407,70 @@ def setMaterialID(mtls, newid):
         try:
             _setMaterialID(mtl, newid)
         except RuntimeError:
-            pc.warning('%s is not a valid maya material' % mtl)
+            getBackend().warning('%s is not a valid maya material' % mtl)
+
+@singleUndoChunk
+@profiled
+def setMaterialIDs(mtlIDs):
+    ''' sets the ids of many materials in one pass and one undo chunk, the
+    invalid materials are skipped with a warning
+
+    @param mtlIDs {material: id} the materials may be names or PyNodes
+    @return: {material: id that was set} for all the valid materials
+    '''
+    scene = getBackend()
+    names = [str(mtl) for mtl in mtlIDs]
+    # two queries for all the materials instead of a few per material
+    valid = scene.withAttr(names, 'outColor')
+    hasID = scene.withAttr([name for name in names if name in valid],
+                           'vrayMaterialId')
+    written = {}
+    for mtl, newid in mtlIDs.items():
+        name = str(mtl)
+        if name not in valid:
+            scene.warning('%s is not a valid maya material' % mtl)
+            continue
+        try:
+            written[mtl] = _writeMaterialID(name, newid, name in hasID)
+        except RuntimeError:
+            scene.warning('%s is not a valid maya material' % mtl)
+    return written
 
-@undoChunk
 def _setMaterialID(mtl, newid):
-    ''' set material ID on the material specified create one if necessary
+    ''' set material ID on the material specified create one if necessary,
+    the callers open the undo chunk
 
     @param mtl MayaName or PyNode for the material on which the ID is to be set
     @param newid integer id that is to be set on the material
+    @return: the id that was set, raises RuntimeError if mtl is not a material
     '''
-    try:
-        newid = int( newid )
-    except ValueError:
-        newid = 0
+    scene = getBackend()
     mtlNode = mayaMaterial(mtl)
 
     if mtlNode is None:
-        pc.error("Provided object %s is not a valid material" % mtl)
+        scene.error("Provided object %s is not a valid material" % mtl)
+
+    return _writeMaterialID(str(mtlNode), newid,
+                            scene.hasAttr(str(mtlNode), 'vrayMaterialId'))
 
+def _writeMaterialID(mtl, newid, hasAttr):
+    ''' @param mtl: name of a valid material
+    @param hasAttr: True if the material has the vrayMaterialId attribute
+    @return: the id that was set
+    '''
     try:
-        mtlNode.vrayMaterialId.set(newid)
-    except AttributeError:
-        pc.addAttr(mtlNode, ln='vrayMaterialId', at='long', keyable=False,
-                min=0, smx=10, readable=True,
-                storable=True, writable=True, dv=0)
-        mtlNode.vrayMaterialId.set(newid)
+        newid = int( newid )
+    except ValueError:
+        newid = 0
+    if not hasAttr:
+        _addMaterialIDAttr(mtl)
+    getBackend().setAttr(mtl + '.vrayMaterialId', newid)
+    _cacheSet('id', mtl, newid)
+    _allocatorAssign(mtl, newid)
+    return newid
 
 @undoChunk
+@profiled
 def getMaterialID(mtl, createNewID=False):
     ''' Get the vray material ID of the material, if it doesnt exist create
     one and assign the lowest unique ID value if required
@@ -422,35 +1479,36 @@ def getMaterialID(mtl, createNewID=False):
     @param createNewID if True a new unique id is created if one is not found
     already
     '''
-
+    scene = getBackend()
     mtlNode = mayaMaterial(mtl)
-    mtlID = None
     if mtlNode is None:
-        pc.error("Provided object %s is not a valid material" % mtl)
-    try:
-        mtlID = mtlNode.vrayMaterialId.get()
-        # print 'getting id ', mtlID
-    except AttributeError:
+        scene.error("Provided object %s is not a valid material" % mtl)
+    mtlID = _materialIDFromName(str(mtlNode))
 
-        if createNewID:
-            pc.addAttr(mtlNode, ln='vrayMaterialId', at='long', keyable=False,
-            min=0, smx=10, readable=True, storable=True, writable=True, dv=0)
-            mtlID = getLowestUniqueID()
-            pc.warning('Creating and assigning new unique id = %d' % mtlID)
-            mtlNode.vrayMaterialId.set(mtlID)
+    if mtlID is None and createNewID:
+        _addMaterialIDAttr(mtlNode)
+        mtlID = getLowestUniqueID()
+        scene.warning('Creating and assigning new unique id = %d' % mtlID)
+        scene.setAttr(str(mtlNode) + '.vrayMaterialId', mtlID)
+        _cacheSet('id', mtlNode, mtlID)
+        _allocatorAssign(mtlNode, mtlID)
 
     return mtlID
 
 @undoChunk
+@profiled
 def setMatteMaterialID(matte, mtlID=[]):
     ''' sets the materials ids for the given multimatte
     '''
+    scene = getBackend()
     if mtlID:
-        pc.setAttr(matte+ ".vray_redid_multimatte", int(mtlID[0]))
-        pc.setAttr(matte+ ".vray_greenid_multimatte", int(mtlID[1]))
-        pc.setAttr(matte+ ".vray_blueid_multimatte", int(mtlID[2]))
+        scene.setAttr(matte+ ".vray_redid_multimatte", int(mtlID[0]))
+        scene.setAttr(matte+ ".vray_greenid_multimatte", int(mtlID[1]))
+        scene.setAttr(matte+ ".vray_blueid_multimatte", int(mtlID[2]))
+        invalidate([matte])
 
 @undoChunk
+@profiled
 def renameMatte(oldName, newName):
     '''
     This function reanmes an existing multimatte
@@ -458,41 +1516,119 @@ def renameMatte(oldName, newName):
     @params newName of the multimatte (as a string)
     returns the newName
     '''
+    scene = getBackend()
     try:
-        newName = pc.rename (oldName, newName)
+        newName = scene.rename(str(oldName), newName)
     except RuntimeError:
         return oldName
-    pc.setAttr(oldName+".vray_name_multimatte",newName)
-    return newName
+    invalidate([oldName, newName])
+    scene.setAttr(newName+".vray_name_multimatte",newName)
+    return scene.node(newName)
 
 @undoChunk
+@profiled
 def deleteMattes(mattes = []):
-    pc.delete(mattes)
+    getBackend().delete([str(m) for m in mattes])
+    invalidate(mattes)
 
+@profiled
 def undo():
-    pc.undo()
+    getBackend().undo()
+    clearCache()
 
+@profiled
 def getAllMaterials():
     '''
     @return: the list of all materials
-    all_materials = []
-    meshes = pc.ls(type = 'mesh')
-    for mesh in meshes:
-        material = materials_helper(mesh)
-        for key in material:
-            all_materials += material[key]
-    #remove the duplications in the list of materials
-    all_materials_set = set(all_materials)
-    all_materials = list(all_materials_set)
-    return all_materials
-    '''
-    allse = pc.ls(type='shadingEngine')
+    '''
+    return _nodes(_sceneMaterialNames())
+
+def _sceneMaterialNames():
+    ''' @return: set of the names of the shaders of all the shadingEngines
+    and of their sub materials '''
+    scene = getBackend()
+    allse = scene.ls(type='shadingEngine')
+    network = ShadingNetwork()
     allmtls = set()
-    for se in allse:
-        ssList = se.surfaceShader.inputs()
-        for ss in ssList:
-            allmtls.add(ss)
-    return list(allmtls)
+    for shader in set(scene.listConnections([se + '.surfaceShader'
+                                             for se in allse],
+                                            destination=False)):
+        allmtls.update(network.materials(shader))
+    return allmtls
+
+def scanMaterials(chunkSize=100):
+    '''
+    Finds the materials of the scene a few shadingEngines at a time so that
+    the caller can process them between the chunks (e.g. from an event loop)
+    @param chunkSize: number of shadingEngines read in every step
+    @return: generator of (done, total, [PyNodes of the new materials]), done
+    and total count the shadingEngines
+    The shaders of the referenced files with a valid table in the reference
+    cache are taken from their tables, the tables of the others are stored
+    at the end of the scan.
+    '''
+    scene = getBackend()
+    cached = {}  # {se: shader} read from the tables of the references
+    misses = ()  # namespace prefixes of the references without a table
+    tables = {}  # {se: (shader, mtlID, members)} to store for the misses
+    if _referenceCache is not None and scene.references():
+        for se, shader, mtlID, members in _referenceCache.entries():
+            cached[se] = shader
+            if mtlID is not _missing:
+                _cacheSet('id', shader, mtlID)
+        misses = tuple([namespace + ':' for path, namespace, edited
+                        in _referenceCache.misses])
+    allse = scene.ls(type='shadingEngine')
+    total = len(allse)
+    seen = set()
+    network = ShadingNetwork()
+    for start in range(0, total, chunkSize):
+        chunk = allse[start:start + chunkSize]
+        shaders = [cached[se] for se in chunk if se in cached]
+        live = []
+        for se in chunk:
+            if se in cached:
+                continue
+            if not misses or not se.startswith(misses):
+                live.append(se)
+                continue
+            # the shadingEngines of the references missed by the cache are
+            # read one by one for their tables
+            shader = _surfaceShaderName(se)
+            if shader is None:
+                continue
+            members = [(plug.split('.', 1)[0], _instanceNumber(plug))
+                       for plug in scene.listConnections(se + '.dagSetMembers',
+                                destination=False, asPlugs=True, type='mesh')]
+            tables[se] = (shader, _materialIDFromName(shader), members)
+            shaders.append(shader)
+        if live:
+            shaders += scene.listConnections([se + '.surfaceShader'
+                                              for se in live],
+                                             destination=False)
+        mtls = []
+        for shader in shaders:
+            for mtl in network.materials(shader):
+                if mtl not in seen:
+                    seen.add(mtl)
+                    mtls.append(mtl)
+        yield min(start + chunkSize, total), total, _nodes(mtls)
+    if misses:
+        _referenceCache.update(tables)
+
+def scanMaterialMultiMattes(chunkSize=50):
+    '''
+    Reads the ids of the material multimattes a few mattes at a time
+    @param chunkSize: number of mattes read in every step
+    @return: generator of (done, total, [(matteName, [red, green, blue])])
+    '''
+    mattes = _multiMatteNames(materialOnly=True)
+    total = len(mattes)
+    for start in range(0, total, chunkSize):
+        chunk = mattes[start:start + chunkSize]
+        ids = matteToMtlID(chunk)
+        yield (min(start + chunkSize, total), total,
+               [(matte, ids[matte]) for matte in chunk])
 
 def materialExists(mtlName):
     return mayaMaterial(mtlName)
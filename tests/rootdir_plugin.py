@@ -0,0 +1,19 @@
+'''
+A pytest plugin loaded by pytest.ini. The root of the repository is the maya
+package of the plugin and its __init__ imports the GUI, pytest would import it
+as the package of the tests, so the root is collected as a plain directory.
+'''
+#--------------------------------------------
+# Name:         rootdir_plugin.py
+# Purpose:      Keeps pytest from importing the package of the repository
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import pytest
+
+def pytest_collect_directory(path, parent):
+    if path == parent.config.rootpath:
+        return pytest.Dir.from_parent(parent, path=path)
@@ -0,0 +1,79 @@
+'''
+Tests of the batch processing on the fake backend, the scene files are json
+files of the parameters of benchmark.makeScene.
+'''
+#--------------------------------------------
+# Name:         test_batch.py
+# Purpose:      Tests of batch with the fake backend
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import utilities as matte_util
+import batch
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scenes = []
+        for num in range(2):
+            path = os.path.join(self.directory, 'shot%d.json' % num)
+            out = open(path, 'w')
+            json.dump({'meshes': 20, 'materials': 5 + num, 'seed': num}, out)
+            out.close()
+            self.scenes.append(path)
+
+    def tearDown(self):
+        matte_util.setBackend(None)
+        shutil.rmtree(self.directory)
+
+    def test_process_scene(self):
+        results = batch.processScene(self.scenes[0],
+                                     ['mattes', 'audit', 'checkids'],
+                                     backend='fake')
+        self.assertEqual([action for action, result in results],
+                         ['mattes', 'audit', 'checkids'])
+        self.assertEqual(len(results[0][1]), 2)
+        self.assertEqual(results[1][1]['dead'], [])
+        self.assertEqual(results[2][1]['missing'], [])
+
+    def test_run_batch(self):
+        missing = os.path.join(self.directory, 'missing.json')
+        summary = batch.runBatch(self.scenes + [missing], ['mattes'],
+                                 jobs=2, timeout=60, retries=1,
+                                 backend='fake')
+        self.assertEqual((summary['ok'], summary['failed']), (2, 1))
+        scenes = summary['scenes']
+        self.assertEqual([result['scene'] for result in scenes],
+                         self.scenes + [missing])
+        self.assertEqual(len(scenes[1]['actions'][0][1]), 2)
+        # the failed scene was tried again once
+        self.assertEqual(scenes[2]['attempt'], 2)
+        self.assertTrue('IOError' in scenes[2]['error'] or
+                        'FileNotFoundError' in scenes[2]['error'])
+
+    def test_main(self):
+        out = os.path.join(self.directory, 'summary.json')
+        code = batch.main(['--backend', 'fake', '--jobs', '1', '--out', out,
+                           '--profile', '--action', 'audit'] + self.scenes)
+        self.assertEqual(code, 0)
+        handle = open(out)
+        summary = json.load(handle)
+        handle.close()
+        self.assertEqual(summary['ok'], 2)
+        self.assertTrue(summary['scenes'][0]['profile'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+'''
+Tests of the memoization of the scene queries in utilities, on a
+scene_backend.FakeScene.
+'''
+#--------------------------------------------
+# Name:         test_cache.py
+# Purpose:      Tests of the LRU cache of the utilities
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import scene_backend as sb
+import utilities as matte_util
+
+class LRUCacheTest(unittest.TestCase):
+    def test_eviction(self):
+        cache = matte_util.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertFalse('b' in cache)
+        self.assertEqual(sorted(cache.data), ['a', 'c'])
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(cache.get('c', 'none'), 'none')
+
+class SceneCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.scene = sb.FakeScene()
+        self.scene.addMaterial('ns:mtl_shd', mtlID=3)
+        self.counting = sb.CountingBackend(self.scene)
+        matte_util.setBackend(self.counting)
+        self.watched = []
+        matte_util.enableCache(watch=self.watched.append)
+
+    def tearDown(self):
+        matte_util.disableCache()
+        matte_util.setBackend(None)
+
+    def test_memoized_until_invalidated(self):
+        self.assertEqual(matte_util._materialIDFromName('ns:mtl_shd'), 3)
+        self.counting.reset()
+        self.assertEqual(matte_util._materialIDFromName('ns:mtl_shd'), 3)
+        self.assertEqual(self.counting.total(), 0)
+        # an edit made behind the back of the module
+        self.scene.setAttr('ns:mtl_shd.vrayMaterialId', 5)
+        self.assertEqual(matte_util._materialIDFromName('ns:mtl_shd'), 3)
+        matte_util.invalidate(['ns:mtl_shd'])
+        self.assertEqual(matte_util._materialIDFromName('ns:mtl_shd'), 5)
+
+    def test_own_edits_update_the_cache(self):
+        matte_util._materialIDFromName('ns:mtl_shd')
+        matte_util.setMaterialIDs({'ns:mtl_shd': 7})
+        self.counting.reset()
+        self.assertEqual(matte_util._materialIDFromName('ns:mtl_shd'), 7)
+        self.assertEqual(self.counting.total(), 0)
+
+    def test_cached_nodes_are_watched(self):
+        matte_util._materialIDFromName('ns:mtl_shd')
+        self.assertEqual(self.watched, ['ns:mtl_shd'])
+        matte_util._materialIDFromName('ns:mtl_shd')
+        self.assertEqual(self.watched, ['ns:mtl_shd'])
+        matte_util.disableCache()
+        matte_util.enableCache()
+        matte_util._materialIDFromName('ns:mtl_shd')
+        self.assertEqual(self.watched, ['ns:mtl_shd'])
+
+if __name__ == '__main__':
+    unittest.main()
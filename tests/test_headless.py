@@ -0,0 +1,284 @@
+'''
+Headless tests of the scene algorithms, they run on a scene_backend.FakeScene
+and need neither maya nor a display. Run them from the root of the repository
+with
+    python -m pytest
+or
+    python -m unittest discover -s tests
+'''
+#--------------------------------------------
+# Name:         test_headless.py
+# Purpose:      Tests of the utilities against the in memory scene
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import scene_backend as sb
+import utilities as matte_util
+import matte_optimizer as mo
+
+class SceneTestCase(unittest.TestCase):
+    ''' builds a FakeScene with a few materials assigned to two instances of
+    a mesh and makes the utilities work on it '''
+    def setUp(self):
+        matte_util.clearCache()
+        self.scene = sb.FakeScene()
+        matte_util.setBackend(self.scene)
+        self.ses = []
+        for num in range(4):
+            mtl, se = self.scene.addMaterial('ns:mtl%d_shd' % num,
+                                             mtlID=(num or None))
+            self.ses.append(se)
+        self.paths = self.scene.addMesh('boxShape', instances=2)
+        self.scene.assign(self.paths[0], self.ses[0])
+        self.scene.assign(self.paths[1], self.ses[1], faceSet=0)
+        self.scene.assign(self.paths[1], self.ses[2], faceSet=1)
+
+    def tearDown(self):
+        matte_util.setBackend(None)
+        matte_util.clearCache()
+
+class SceneIndexTest(SceneTestCase):
+    def test_maps(self):
+        index = matte_util.SceneIndex()
+        self.assertEqual(index.idToMaterials[1], ['ns:mtl1_shd'])
+        self.assertEqual(index.materialToID['ns:mtl0_shd'], None)
+        self.assertEqual(index.meshToMaterials[self.paths[0]],
+                         {None: ['ns:mtl0_shd']})
+        self.assertEqual(sorted(index.meshToMaterials[self.paths[1]]), [1, 2])
+        self.assertEqual(index.materialToMeshes['ns:mtl3_shd'], set())
+
+    def test_materials_agrees(self):
+        index = matte_util.SceneIndex()
+        self.assertEqual(matte_util.materials(self.paths),
+                         matte_util.materials(self.paths, index))
+
+class MaterialIDAllocatorTest(SceneTestCase):
+    def test_lowest(self):
+        allocator = matte_util.MaterialIDAllocator()
+        self.assertEqual(allocator.lowest(), 4)
+        allocator.assign('ns:mtl0_shd', 4)
+        self.assertEqual(allocator.lowest(), 5)
+        allocator.assign('ns:mtl2_shd', 0)
+        self.assertEqual(allocator.lowest(), 2)
+
+    def test_include_zero(self):
+        allocator = matte_util.MaterialIDAllocator(True)
+        self.assertEqual(allocator.lowest(), 0)
+
+    def test_given_ids(self):
+        allocator = matte_util.MaterialIDAllocator(materialIDs={'a': 1,
+                                                                'b': 3})
+        self.assertEqual(allocator.lowest(), 2)
+
+class MaterialIDReportTest(unittest.TestCase):
+    def setUp(self):
+        self.scene = sb.FakeScene()
+        matte_util.setBackend(self.scene)
+        for name, mtlID in (('a1:skin', 1), ('a2:skin', 1), ('b:cloth', 1),
+                            ('c:eye', 2), ('hair', None), ('a1:nail', 0),
+                            ('a2:nail', None)):
+            self.scene.addMaterial(name, mtlID=mtlID)
+
+    def tearDown(self):
+        matte_util.setBackend(None)
+
+    def test_report(self):
+        report = matte_util.MaterialIDReport()
+        self.assertEqual(report.conflicts, {1: [['a1:skin', 'a2:skin'],
+                                                ['b:cloth']]})
+        self.assertEqual(report.missing, ['a1:nail', 'a2:nail', 'hair'])
+        self.assertFalse(report.isClean())
+        self.assertEqual(report.report().splitlines()[0],
+                         'id 1 is shared by a1:skin a2:skin, b:cloth')
+
+    def test_plan_and_fix(self):
+        report = matte_util.MaterialIDReport()
+        self.assertEqual(report.plan(fixMissing=False), {'b:cloth': 3})
+        written = report.fix()
+        self.assertEqual(written, {'b:cloth': 3, 'a1:nail': 4,
+                                   'a2:nail': 4, 'hair': 5})
+        self.assertTrue(report.isClean())
+        self.assertEqual(report.report(), '7 materials, no conflicts')
+        # the fix is undone in one step
+        matte_util.undo()
+        self.assertEqual(list(matte_util.MaterialIDReport().conflicts), [1])
+
+class SetMaterialIDsTest(SceneTestCase):
+    def test_bulk_write(self):
+        counting = sb.CountingBackend(self.scene)
+        matte_util.setBackend(counting)
+        written = matte_util.setMaterialIDs({'ns:mtl0_shd': 5,
+                                             'ns:mtl1_shd': '6',
+                                             'boxShape': 7, 'nothing': 8})
+        self.assertEqual(written, {'ns:mtl0_shd': 5, 'ns:mtl1_shd': 6})
+        self.assertEqual(sorted(self.scene.warnings),
+                         ['boxShape is not a valid maya material',
+                          'nothing is not a valid maya material'])
+        # the validity is checked once for all the materials
+        self.assertEqual(counting.counts['withAttr'], 2)
+        self.assertFalse('hasAttr' in counting.counts)
+        self.assertEqual(counting.counts['addAttr'], 1)
+        self.assertEqual(matte_util.getMaterialID('ns:mtl0_shd'), 5)
+        matte_util.undo()
+        self.assertEqual(matte_util.getMaterialID('ns:mtl0_shd'), None)
+        self.assertEqual(matte_util.getMaterialID('ns:mtl1_shd'), 1)
+
+    def test_single_material(self):
+        matte_util.setMaterialID(['ns:mtl2_shd', 'nothing'], 9)
+        self.assertEqual(matte_util.getMaterialID('ns:mtl2_shd'), 9)
+        self.assertEqual(self.scene.warnings,
+                         ['nothing is not a valid maya material'])
+
+class CreateMultiMattesTest(SceneTestCase):
+    def test_create_and_undo(self):
+        mattes = matte_util.createMultiMattes([[1, 2], [3]], ['a_matte',
+                                                              'b_matte'])
+        self.assertEqual([str(m) for m in mattes], ['a_matte', 'b_matte'])
+        ids = matte_util.matteToMtlID(mattes)
+        self.assertEqual(ids['a_matte'], [1, 2, 0])
+        self.assertEqual(ids['b_matte'], [3, 0, 0])
+        matte_util.undo()
+        self.assertEqual(matte_util.getAllMultiMattes(), [])
+
+    def test_make_mtl_matte_undo(self):
+        mattes = matte_util.makeMtlMatte(['ns:mtl0_shd', 'ns:mtl1_shd'])
+        self.assertEqual(len(mattes), 1)
+        self.assertEqual(matte_util.getMaterialID('ns:mtl0_shd'), 4)
+        matte_util.undo()
+        self.assertEqual(matte_util.getAllMultiMattes(), [])
+        self.assertEqual(matte_util.getMaterialID('ns:mtl0_shd'), None)
+
+class AssignmentResolverTest(SceneTestCase):
+    def setUp(self):
+        SceneTestCase.setUp(self)
+        self.props = self.scene.addMesh('propShape', instances=20)
+        for path in self.props:
+            self.scene.assign(path, self.ses[3])
+        self.counting = sb.CountingBackend(self.scene)
+        matte_util.setBackend(self.counting)
+
+    def test_signatures_are_shared(self):
+        resolver = matte_util.AssignmentResolver()
+        result = resolver.resolve(self.props)
+        self.assertEqual(result[self.props[0]], {3: ['ns:mtl3_shd']})
+        self.assertTrue(result[self.props[0]] is result[self.props[19]])
+        # the connections of the shape for all its instances and the shader
+        # of their shadingEngine
+        self.assertEqual(self.counting.counts['listConnections'], 2)
+        self.assertEqual(len(resolver.signatures), 1)
+
+    def test_ids_are_read_live(self):
+        resolver = matte_util.AssignmentResolver()
+        resolver.resolve(self.props[:1])
+        matte_util.setMaterialIDs({'ns:mtl3_shd': 8})
+        self.assertEqual(resolver.resolve(self.props[1:2])[self.props[1]],
+                         {8: ['ns:mtl3_shd']})
+
+    def test_forget(self):
+        resolver = matte_util.AssignmentResolver()
+        self.assertEqual(resolver.materialNames(self.paths[0]),
+                         ('ns:mtl0_shd',))
+        self.scene.assign(self.paths[0], self.ses[3])
+        self.assertEqual(resolver.materialNames(self.paths[0]),
+                         ('ns:mtl0_shd',))
+        resolver.forget(['boxShape'])
+        self.assertEqual(sorted(resolver.materialNames(self.paths[0])),
+                         ['ns:mtl0_shd', 'ns:mtl3_shd'])
+
+class FaceRunsTest(unittest.TestCase):
+    def test_merge(self):
+        runs = matte_util.FaceRuns([5, 9, 0, 3, 4, 4, 20, 20])
+        self.assertEqual(list(runs), [(0, 9), (20, 20)])
+        self.assertEqual(runs.count(), 11)
+        self.assertTrue(7 in runs)
+        self.assertFalse(10 in runs)
+
+    def test_components(self):
+        runs = matte_util.FaceRuns.fromComponents(
+                ['f[0:49]', 'f[60]', 'boxShape.vtx[3]'], 100)
+        self.assertEqual(runs.components('boxShape'),
+                         ['boxShape.f[0:49]', 'boxShape.f[60]'])
+        whole = matte_util.FaceRuns.fromComponents(['boxShape.f[*]'], 100)
+        self.assertEqual(whole, matte_util.FaceRuns([0, 99]))
+        self.assertEqual(runs.union(whole), whole)
+
+class ShadingNetworkTest(SceneTestCase):
+    def setUp(self):
+        SceneTestCase.setUp(self)
+        scene = self.scene
+        self.blend, self.blendSE = scene.addMaterial('blend',
+                                                     type='VRayBlendMtl')
+        scene.addMaterial('coat', mtlID=11)
+        scene.addMaterial('base', mtlID=12)
+        scene.createNode('file', 'tex', {'outColor': (1, 1, 1)})
+        scene.connectAttr('base.outColor', 'blend.base_material')
+        scene.connectAttr('coat.outColor', 'blend.coat_material_0')
+        scene.connectAttr('tex.outColor', 'blend.coat_material_1')
+        self.mesh = scene.addMesh('blendShape')[0]
+        scene.assign(self.mesh, self.blendSE)
+
+    def test_sub_materials(self):
+        network = matte_util.ShadingNetwork()
+        self.assertEqual(network.materials('blend'), ('blend', 'base',
+                                                      'coat'))
+        self.assertEqual(network.materials('ns:mtl1_shd'), ('ns:mtl1_shd',))
+        self.assertEqual(matte_util.materials([self.mesh])[self.mesh],
+                         {None: ['blend'], 11: ['coat'], 12: ['base']})
+
+    def test_nested_and_cycle(self):
+        scene = self.scene
+        scene.addMaterial('twoSided', type='VRayMtl2Sided')
+        scene.connectAttr('blend.outColor', 'twoSided.frontMaterial')
+        # a cycle back to the two sided shader ends the walk
+        scene.connectAttr('twoSided.outColor', 'blend.coat_material_2')
+        network = matte_util.ShadingNetwork()
+        self.assertEqual(sorted(network.materials('twoSided')),
+                         ['base', 'blend', 'coat', 'twoSided'])
+        self.assertEqual(sorted(network.materials('blend')),
+                         ['base', 'blend', 'coat', 'twoSided'])
+
+    def test_index_and_allocator(self):
+        index = matte_util.SceneIndex()
+        self.assertEqual(index.idToMaterials[11], ['coat'])
+        self.assertTrue(self.mesh in index.materialToMeshes['coat'])
+        allocator = matte_util.MaterialIDAllocator()
+        self.assertEqual(allocator.mtlToID['base'], 12)
+
+class MatteOptimizerTest(SceneTestCase):
+    def setUp(self):
+        SceneTestCase.setUp(self)
+        matte_util.createMultiMattes([[1, 0, 0], [2, 0, 0], [2, 0, 0],
+                                      [7, 8, 0]],
+                                     ['one', 'two', 'twin', 'dead'])
+
+    def test_audit(self):
+        audit = mo.MatteAudit()
+        self.assertEqual(audit.dead, ['dead'])
+        self.assertEqual(audit.duplicates, [('two', 'twin')])
+        self.assertFalse(audit.isClean())
+        self.assertEqual(sorted(audit.deleteRedundant()), ['dead', 'two'])
+        self.assertTrue(audit.isClean())
+
+    def test_repack(self):
+        repack = mo.MatteRepack(dropUnused=True)
+        self.assertEqual(repack.triplets, [[1, 2]])
+        self.assertTrue(repack.isNeeded())
+        repack.apply()
+        names = [str(m) for m in matte_util.getAllMaterialMultiMattes()]
+        self.assertEqual(len(names), 1)
+        self.assertEqual(matte_util.matteToMtlID(names)[names[0]], [1, 2, 0])
+        matte_util.undo()
+        self.assertEqual(len(matte_util.getAllMaterialMultiMattes()), 4)
+
+if __name__ == '__main__':
+    unittest.main()
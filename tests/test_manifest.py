@@ -0,0 +1,104 @@
+'''
+Tests of the export and import of the matte manifests, from one FakeScene to
+another.
+'''
+#--------------------------------------------
+# Name:         test_manifest.py
+# Purpose:      Tests of manifest against the in memory scene
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import scene_backend as sb
+import utilities as matte_util
+import manifest
+
+def shot(namespaces, ids=True):
+    ''' @return: a FakeScene with a skin and an eye material in every
+    namespace, with ids 3 and 4 if ids is True '''
+    scene = sb.FakeScene()
+    for ns in namespaces:
+        for num, name in enumerate(('skin_mtl', 'eye_mtl')):
+            mtl, se = scene.addMaterial('%s:%s' % (ns, name),
+                                        mtlID=(ids and num + 3 or None))
+            scene.assign(scene.addMesh('%s:%sShape' % (ns, name))[0], se)
+    return scene
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        matte_util.setBackend(shot(['char1']))
+        matte_util.createMultiMattes([[3, 4]], ['skin_eye_matte'])
+        self.manifest = manifest.exportManifest()
+
+    def tearDown(self):
+        matte_util.setBackend(None)
+        shutil.rmtree(self.directory)
+
+    def test_export(self):
+        self.assertEqual(self.manifest['materials'],
+                         {'char1:skin_mtl': 3, 'char1:eye_mtl': 4})
+        self.assertEqual(self.manifest['mattes'],
+                         {'skin_eye_matte': [3, 4, 0, True,
+                                             'skin_eye_matte']})
+
+    def test_round_trip(self):
+        path = os.path.join(self.directory, 'shot.json')
+        manifest.writeManifest(path, self.manifest)
+        read = manifest.readManifest(path)
+        self.assertEqual(read, self.manifest)
+
+        scene = shot(['char1'], ids=False)
+        matte_util.setBackend(scene)
+        result = manifest.importManifest(read)
+        self.assertEqual(result['materials'], ['char1:eye_mtl',
+                                               'char1:skin_mtl'])
+        self.assertEqual(result['mattes'], ['skin_eye_matte'])
+        self.assertEqual(manifest.exportManifest(), self.manifest)
+        # a second import finds nothing to change
+        undoSteps = len(scene.undoStack)
+        result = manifest.importManifest(read)
+        self.assertEqual((result['materials'], result['mattes']), ([], []))
+        self.assertEqual(len(scene.undoStack), undoSteps)
+        # the import is undone in one step
+        matte_util.undo()
+        self.assertEqual(matte_util.getAllMultiMattes(), [])
+        self.assertEqual(matte_util.getMaterialID('char1:skin_mtl'), None)
+
+    def test_remap(self):
+        self.assertEqual(manifest.remapName('char1:skin_mtl',
+                                            {'char1': ['char2', 'char3']}),
+                         ['char2:skin_mtl', 'char3:skin_mtl'])
+        self.assertEqual(manifest.remapName('a:b:mtl', {'a': 'c',
+                                                        'a:b': ''}),
+                         ['mtl'])
+        self.assertEqual(manifest.remapName('mtl', {'x': 'y'}), ['mtl'])
+
+        matte_util.setBackend(shot(['char2', 'char3'], ids=False))
+        result = manifest.importManifest(self.manifest,
+                                         {'char1': ['char2', 'char3',
+                                                    'char4']})
+        self.assertEqual(len(result['materials']), 4)
+        self.assertEqual(sorted(result['missing']), ['char4:eye_mtl',
+                                                     'char4:skin_mtl'])
+        self.assertEqual(matte_util.getMaterialID('char3:eye_mtl'), 4)
+
+    def test_newer_version(self):
+        path = os.path.join(self.directory, 'new.json')
+        self.manifest['version'] = manifest.VERSION + 1
+        manifest.writeManifest(path, self.manifest)
+        self.assertRaises(ValueError, manifest.readManifest, path)
+
+if __name__ == '__main__':
+    unittest.main()
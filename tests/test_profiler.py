@@ -0,0 +1,99 @@
+'''
+Tests of the profiling of the utilities, on a scene_backend.FakeScene.
+'''
+#--------------------------------------------
+# Name:         test_profiler.py
+# Purpose:      Tests of the Profiler of the utilities
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import scene_backend as sb
+import utilities as matte_util
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.scene = sb.FakeScene()
+        for num in range(3):
+            self.scene.addMaterial('mtl%d' % num, mtlID=num + 1)
+        matte_util.setBackend(self.scene)
+
+    def tearDown(self):
+        matte_util.disableProfiling()
+        matte_util.setBackend(None)
+
+    def test_off(self):
+        self.assertEqual(matte_util.getProfiler(), None)
+        matte_util.getLowestUniqueID()
+        self.assertTrue(matte_util.getBackend() is self.scene)
+
+    def test_report(self):
+        profiler = matte_util.enableProfiling()
+        self.assertTrue(matte_util.enableProfiling() is profiler)
+        matte_util.getLowestUniqueID()
+        matte_util.getLowestUniqueID()
+        matte_util.makeMtlMatte(['mtl0', 'mtl1'])
+        report = profiler.report()
+        self.assertEqual(report['getLowestUniqueID']['calls'], 2)
+        self.assertTrue(report['getLowestUniqueID']['scene']['ls'] >= 2)
+        # the nested calls are recorded deeper than their caller
+        depths = dict([(name, depth) for name, start, seconds, depth, calls
+                       in profiler.events])
+        self.assertEqual(depths['makeMtlMatte'], 0)
+        self.assertEqual(depths['createMultiMattes'], 1)
+        self.assertEqual(profiler.summary().splitlines()[0].split(),
+                         ['operation', 'calls', 'total', 'max', 'scene'])
+
+    def test_backend_restored(self):
+        matte_util.enableProfiling()
+        matte_util.getLowestUniqueID()
+        self.assertTrue(isinstance(matte_util.getBackend(),
+                                   sb.CountingBackend))
+        profiler = matte_util.disableProfiling()
+        self.assertTrue(matte_util.getBackend() is self.scene)
+        self.assertEqual(matte_util.disableProfiling(), None)
+        self.assertEqual(len(profiler.events), 1)
+
+    def test_backend_changed_while_profiling(self):
+        profiler = matte_util.enableProfiling()
+        matte_util.getLowestUniqueID()
+        other = sb.FakeScene()
+        matte_util.setBackend(other)
+        matte_util.getLowestUniqueID()
+        self.assertTrue(profiler.counter.backend is other)
+        matte_util.disableProfiling()
+        self.assertTrue(matte_util.getBackend() is other)
+
+    def test_write(self):
+        directory = tempfile.mkdtemp()
+        try:
+            profiler = matte_util.enableProfiling()
+            matte_util.getLowestUniqueID()
+            path = os.path.join(directory, 'profile.json')
+            profiler.write(path)
+            profiler.write(path + '.trace', chrome=True)
+            handle = open(path)
+            data = json.load(handle)
+            handle.close()
+            self.assertEqual(data['events'][0]['name'], 'getLowestUniqueID')
+            handle = open(path + '.trace')
+            trace = json.load(handle)
+            handle.close()
+            self.assertEqual(trace['traceEvents'][0]['ph'], 'X')
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+'''
+Tests of the on disk cache of the material tables of the references, on a
+scene_backend.FakeScene with a rig referenced in a few namespaces.
+'''
+#--------------------------------------------
+# Name:         test_reference_cache.py
+# Purpose:      Tests of reference_cache against the in memory scene
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import scene_backend as sb
+import utilities as matte_util
+import reference_cache as rc
+
+def shot(rig, namespaces=3):
+    ''' @return: a FakeScene with the rig referenced in every namespace and a
+    local material '''
+    scene = sb.FakeScene()
+    for num in range(namespaces):
+        ns = 'char%d' % num
+        ses = [scene.addMaterial('%s:mtl%d' % (ns, mtl), mtlID=mtl + 1)[1]
+               for mtl in range(2)]
+        for mesh in range(4):
+            for path in scene.addMesh('%s:body%dShape' % (ns, mesh), 2):
+                scene.assign(path, ses[mesh % 2])
+        scene.addReference(rig, ns)
+    mtl, se = scene.addMaterial('local_mtl', mtlID=9)
+    scene.assign(scene.addMesh('propShape')[0], se)
+    return scene
+
+def maps(index):
+    return (sorted(index.materialToID.items()),
+            sorted([(mesh, sorted(mtls.items()))
+                    for mesh, mtls in index.meshToMaterials.items()]))
+
+class ReferenceCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rig = os.path.join(self.directory, 'rig.mb')
+        out = open(self.rig, 'w')
+        out.write('rig')
+        out.close()
+        self.cacheDirectory = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        matte_util.setBackend(None)
+        shutil.rmtree(self.directory)
+
+    def test_second_build_uses_the_table(self):
+        scene = shot(self.rig)
+        matte_util.setBackend(scene)
+        live = maps(matte_util.SceneIndex())
+
+        matte_util.SceneIndex(rc.ReferenceCache(self.cacheDirectory))
+        cache = rc.ReferenceCache(self.cacheDirectory)
+        handle = open(cache.tablePath(self.rig))
+        table = json.load(handle)
+        handle.close()
+        self.assertEqual(len(table['shadingEngines']), 2)
+
+        counting = sb.CountingBackend(shot(self.rig))
+        matte_util.setBackend(counting)
+        index = matte_util.SceneIndex(cache)
+        self.assertEqual(maps(index), live)
+        # only the local shadingEngine is read from the scene
+        self.assertEqual(counting.counts['listConnections'], 2)
+
+    def test_edited_reference(self):
+        scene = shot(self.rig)
+        matte_util.setBackend(scene)
+        matte_util.SceneIndex(rc.ReferenceCache(self.cacheDirectory))
+        scene = shot(self.rig)
+        scene.setAttr('char1:mtl0.vrayMaterialId', 42)
+        matte_util.setBackend(scene)
+        index = matte_util.SceneIndex(rc.ReferenceCache(self.cacheDirectory))
+        self.assertEqual(index.materialToID['char1:mtl0'], 42)
+        self.assertEqual(index.materialToID['char2:mtl0'], 1)
+
+    def test_changed_file(self):
+        matte_util.setBackend(shot(self.rig))
+        matte_util.SceneIndex(rc.ReferenceCache(self.cacheDirectory))
+        os.utime(self.rig, (1, 1))
+        cache = rc.ReferenceCache(self.cacheDirectory)
+        self.assertEqual(cache.load(self.rig), None)
+
+if __name__ == '__main__':
+    unittest.main()
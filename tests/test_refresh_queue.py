@@ -0,0 +1,45 @@
+'''
+Tests of the coalescing of the refreshes of the models of the GUI.
+'''
+#--------------------------------------------
+# Name:         test_refresh_queue.py
+# Purpose:      Tests of refresh_queue
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import refresh_queue as rq
+
+class RefreshQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = rq.RefreshQueue()
+
+    def test_marks_coalesce(self):
+        self.queue.mark(mattes=False)
+        self.queue.mark(materials=False)
+        self.queue.mark(materials=False)
+        self.assertEqual(self.queue.take([], []), (True, [], True, []))
+        # the marks are applied once
+        self.assertEqual(self.queue.take([], []), (False, [], False, []))
+
+    def test_dirty_nodes_only(self):
+        self.assertEqual(self.queue.take(set(['b', 'a']), set(['m'])),
+                         (False, ['a', 'b'], False, ['m']))
+
+    def test_full_sync_covers_dirty_nodes(self):
+        self.queue.mark()
+        result = self.queue.take(set(['known', 'new']), set(['m']),
+                                 set(['known', 'other']))
+        self.assertEqual(result, (True, ['new'], True, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+'''
+Tests of the search over the rows of the models.
+'''
+#--------------------------------------------
+# Name:         test_search_index.py
+# Purpose:      Tests of search_index
+# Author:       matteWorks contributors
+# License:      GPL v3
+# Created       18/10/2026
+# Copyright:    (c) ICE Animations. All rights reserved
+# Python Version:   2.6
+#--------------------------------------------
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+import search_index as si
+
+class SearchTermsTest(unittest.TestCase):
+    def test_terms(self):
+        self.assertEqual(si.searchTerms('char1:skin_mtl'),
+                         ['skin_mtl', 'char1:skin_mtl', 'char1'])
+        self.assertEqual(si.searchTerms('skin_mtl'),
+                         ['skin_mtl', 'skin_mtl', ''])
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = si.SearchIndex()
+        self.index.set(1, ['boxShape', 'Skin_mtl'])
+        self.index.set(2, ['sphereShape', 'cloth_mtl'])
+
+    def test_search(self):
+        self.assertEqual(self.index.search('SKIN'), set([1]))
+        self.assertEqual(self.index.search('shape'), set([1, 2]))
+        self.assertEqual(self.index.search('nothing'), set())
+        self.assertEqual(self.index.search(''), None)
+
+    def test_refine_and_update(self):
+        self.assertEqual(self.index.search('mtl'), set([1, 2]))
+        self.assertEqual(self.index.search('cloth_mtl'), set([2]))
+        self.index.set(1, ['boxShape', 'cloth_mtl'])
+        self.assertEqual(self.index.result, set([1, 2]))
+        self.index.remove(2)
+        self.assertEqual(self.index.search('cloth'), set([1]))
+
+    def test_many_rows(self):
+        for key in range(3, 200):
+            self.index.set(key, ['mesh%dShape' % key])
+        self.assertEqual(self.index.search('mesh19'),
+                         set([19] + list(range(190, 200))))
+        self.assertEqual(len(self.index.search('shape')), 199)
+
+if __name__ == '__main__':
+    unittest.main()